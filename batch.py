@@ -0,0 +1,230 @@
+"""Batch conversion of many PDFs with long-lived workers and a resumable job journal.
+
+    python batch.py docs/ -o html/ --engine var11 --workers 8
+    python batch.py list.txt -o html/ --engine main
+
+Inputs are directories (searched recursively for *.pdf) or list files with one
+PDF path per line (optionally followed by a tab and the output path). Outputs
+mirror the input layout under the output directory.
+
+Every worker process imports the converter once and converts many documents.
+Each finished document is appended to the journal (JSON lines, default
+<output dir>/journal.jsonl) with its status, time and error. A rerun with the
+same journal skips documents that are already done and unchanged since, so an
+interrupted batch resumes where it stopped; failed documents are retried.
+A failed document's partly written output is removed.
+"""
+import argparse
+import importlib
+import json
+import os
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+
+# engine -> (module, convert function taking (pdf_path, html_path))
+ENGINES = {
+    'var11': ('var11.main', 'convert'),
+    'main': ('main', 'convert'),
+    'var9': ('var9.main', 'pdf_to_html'),
+    'var10': ('var10.main', 'pdf_to_html'),
+    'var2': ('var2.main', 'generate_precise_html'),
+    'var4': ('var4.main', 'pdf_to_html'),
+}
+WORKERS = os.cpu_count() or 1
+JOURNAL_NAME = 'journal.jsonl'
+
+
+def find_jobs(inputs, output_dir):
+    """[(pdf_path, html_path), ...] for directories and list files in inputs."""
+    jobs = []
+    for source in inputs:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.pdf'):
+                        pdf_path = os.path.join(root, name)
+                        rel = os.path.relpath(pdf_path, source)
+                        jobs.append((pdf_path, os.path.join(output_dir, os.path.splitext(rel)[0] + '.html')))
+        elif source.lower().endswith('.pdf'):
+            name = os.path.splitext(os.path.basename(source))[0] + '.html'
+            jobs.append((source, os.path.join(output_dir, name)))
+        else:
+            base = os.path.dirname(source)
+            with open(source, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    pdf_path, _, html_path = line.partition('\t')
+                    pdf_path = os.path.join(base, pdf_path)
+                    if not html_path:
+                        html_path = os.path.join(output_dir, os.path.splitext(os.path.basename(pdf_path))[0] + '.html')
+                    jobs.append((pdf_path, html_path))
+    return jobs
+
+
+def file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class Journal:
+    """Append-only JSON lines log of finished documents; the last record per input wins."""
+
+    def __init__(self, path):
+        self.path = path
+        self.last = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    self.last[record['input']] = record
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def is_done(self, pdf_path, html_path, engine):
+        record = self.last.get(os.path.abspath(pdf_path))
+        return (record is not None and record['status'] == 'done' and record['engine'] == engine
+                and record['output'] == os.path.abspath(html_path)
+                and record['input_state'] == file_state(pdf_path)
+                and record['output_state'] == file_state(html_path))
+
+    def write(self, record):
+        self.last[record['input']] = record
+        self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+# Set in each worker process by _init_worker
+_convert = None
+
+
+def _init_worker(engine):
+    global _convert
+    module_name, function = ENGINES[engine]
+    module = importlib.import_module(module_name)
+    if engine == 'main':
+        module.TABLE_WORKERS = 1  # the batch pool already uses every core
+    _convert = getattr(module, function)
+
+
+def _remove_partial(html_path):
+    # a failed document leaves no half-written output that would look like a result
+    try:
+        os.remove(html_path)
+    except FileNotFoundError:
+        pass
+
+
+def _convert_job(pdf_path, html_path):
+    start = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(html_path)), exist_ok=True)
+        _convert(pdf_path, html_path)
+    except Exception as e:
+        _remove_partial(html_path)
+        return 'error', time.perf_counter() - start, f'{type(e).__name__}: {e}', traceback.format_exc()
+    return 'done', time.perf_counter() - start, None, None
+
+
+def _record(engine, pdf_path, html_path, status, seconds, error=None, trace=None):
+    return {
+        'input': os.path.abspath(pdf_path),
+        'output': os.path.abspath(html_path),
+        'engine': engine,
+        'status': status,
+        'seconds': round(seconds, 3),
+        'error': error,
+        'traceback': trace,
+        'input_state': file_state(pdf_path),
+        'output_state': file_state(html_path) if status == 'done' else None,
+        'finished': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def run_batch(jobs, engine='var11', workers=WORKERS, journal_path=JOURNAL_NAME, force=False):
+    """Convert jobs [(pdf_path, html_path), ...]; returns {'done', 'error', 'skipped'} counts."""
+    if engine not in ENGINES:
+        raise ValueError(f'unknown engine {engine!r}, expected one of {", ".join(ENGINES)}')
+    journal = Journal(journal_path)
+    counts = {'done': 0, 'error': 0, 'skipped': 0}
+    todo = []
+    for pdf_path, html_path in jobs:
+        if not force and journal.is_done(pdf_path, html_path, engine):
+            counts['skipped'] += 1
+        else:
+            todo.append((pdf_path, html_path))
+    print(f'{len(todo)} to convert, {counts["skipped"]} already done')
+
+    def run_pool(jobs, workers):
+        # Converts jobs and journals the results. A worker killed by a crashing document
+        # breaks the whole pool: the jobs in flight at that moment are returned unjournaled.
+        jobs = iter(jobs)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine,)) as pool:
+            pending = deque((job, pool.submit(_convert_job, *job)) for job in islice(jobs, 2 * workers))
+            while pending:
+                job, future = pending[0]
+                try:
+                    status, seconds, error, trace = future.result()
+                except BrokenProcessPool:
+                    return [job for job, _ in pending]
+                pending.popleft()
+                record(job, status, seconds, error, trace)
+                for job in islice(jobs, 1):
+                    pending.append((job, pool.submit(_convert_job, *job)))
+        return []
+
+    def record(job, status, seconds, error=None, trace=None):
+        pdf_path, html_path = job
+        journal.write(_record(engine, pdf_path, html_path, status, seconds, error, trace))
+        counts[status] += 1
+        print(f'[{status}] {pdf_path} ({seconds:.1f}s){" " + error if error else ""}')
+
+    try:
+        todo = iter(todo)
+        while True:
+            suspects = run_pool(todo, workers)
+            if not suspects:
+                break
+            # rerun the documents that were in flight one by one to find the one that crashes
+            for job in suspects:
+                if run_pool([job], 1):
+                    _remove_partial(job[1])
+                    record(job, 'error', 0.0, 'worker process died')
+    finally:
+        journal.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert many PDFs to HTML')
+    parser.add_argument('inputs', nargs='+', help='directories, PDF files or list files (one PDF path per line)')
+    parser.add_argument('-o', '--output-dir', default='html')
+    parser.add_argument('--engine', choices=sorted(ENGINES), default='var11')
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--journal', help=f'job journal (default <output dir>/{JOURNAL_NAME})')
+    parser.add_argument('--force', action='store_true', help='convert documents the journal marks as done')
+    args = parser.parse_args()
+    jobs = find_jobs(args.inputs, args.output_dir)
+    journal = args.journal or os.path.join(args.output_dir, JOURNAL_NAME)
+    counts = run_batch(jobs, args.engine, args.workers, journal, args.force)
+    print(f'Done: {counts}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Throughput and memory benchmark of the converter variants.
+
+Every (variant, document) pair runs in a fresh process so that peak RSS
+belongs to that run alone. Results are written as JSON to compare versions.
+
+    python -m bench.run --pages 10 100 --table-density 0.5 --output bench.json
+"""
+import argparse
+import importlib
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import fitz  # PyMuPDF
+
+from bench.synthetic import make_document
+from common.writer import HtmlWriter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUNDLED_PDFS = ['example.pdf', 'pdf2html_test_tables-3.pdf']
+VARIANTS = ['main', 'var2', 'var4', 'var9', 'var10', 'var11', 'var8']
+
+# Markers yielded by the adapters: document-level work done / one page done /
+# one page done that the converter held back and released in a batch
+SETUP = 'setup'
+PAGE = 'page'
+HELD = 'held'
+
+
+class SkipVariant(Exception):
+    pass
+
+
+def _page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def _consume(chunks, out_path, page_count, sep, held=0):
+    # chunks: head, one chunk per page, tail (the iter_html() contract);
+    # the first held pages are released together, their time is reported as hold_s
+    with HtmlWriter(out_path) as out:
+        chunks = iter(chunks)
+        out.write(next(chunks))
+        yield SETUP
+        for n in range(page_count):
+            out.write(sep + next(chunks))
+            yield HELD if n < held else PAGE
+        for chunk in chunks:
+            out.write(sep + chunk)
+
+
+def run_main(pdf_path, out_path, options):
+    import main
+    # iter_html() holds the header/footer window back until the header and footer are decided
+    page_count = _page_count(pdf_path)
+    return _consume(main.iter_html(pdf_path), out_path, page_count, '', min(main.HEADER_FOOTER_WINDOW, page_count))
+
+
+def run_var11(pdf_path, out_path, options):
+    from var11 import main
+    chunks = main.iter_html(pdf_path, pdf_path, options['workers'], options['chunk_size'])
+    return _consume(chunks, out_path, _page_count(pdf_path), '\n')
+
+
+def run_var9(pdf_path, out_path, options):
+    from var9 import main
+    return _consume(main.iter_html(pdf_path), out_path, _page_count(pdf_path), '\n')
+
+
+def run_var10(pdf_path, out_path, options):
+    from var10 import main
+    return _consume(main.iter_html(pdf_path), out_path, _page_count(pdf_path), '\n')
+
+
+def run_var2(pdf_path, out_path, options):
+    from var2 import main
+    return _consume(main.iter_html(pdf_path), out_path, _page_count(pdf_path), '\n')
+
+
+def run_var4(pdf_path, out_path, options):
+    from var4 import main
+    return _consume(main.iter_html(pdf_path), out_path, _page_count(pdf_path), '\n')
+
+
+def run_var8(pdf_path, out_path, options):
+    if shutil.which('tesseract') is None:
+        raise SkipVariant('tesseract binary not found')
+    from var8 import pipeline
+    # the in-memory render/OCR pipeline that var8 converts with (no PNG files)
+    pages = pipeline.convert_pages(pdf_path, dpi=options['ocr_dpi'])
+    chunks = itertools.chain([pipeline.HTML_HEAD], pages, [pipeline.HTML_TAIL])
+    return _consume(chunks, out_path, _page_count(pdf_path), '\n')
+
+
+MODULES = {variant: 'main' if variant == 'main' else f'{variant}.main' for variant in VARIANTS}
+
+ADAPTERS = {
+    'main': run_main,
+    'var2': run_var2,
+    'var4': run_var4,
+    'var9': run_var9,
+    'var10': run_var10,
+    'var11': run_var11,
+    'var8': run_var8,
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    # RUSAGE_CHILDREN: the largest of the child processes waited for (var11 workers, main's Camelot pool)
+    rss = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def measure(variant, pdf_path, options):
+    """Run one variant on one document in the current process and time every page."""
+    result = {'variant': variant, 'document': os.path.basename(pdf_path)}
+    with tempfile.TemporaryDirectory() as tmp:
+        out_path = os.path.join(tmp, 'output.html')
+        setup = None
+        latencies = []
+        hold, held = 0.0, 0
+        try:
+            # imports are not part of the measured time
+            importlib.import_module(MODULES[variant])
+        except ImportError as e:
+            result.update(status='skipped', reason=f'{type(e).__name__}: {e}')
+            return result
+        start = last = time.perf_counter()
+        try:
+            for marker in ADAPTERS[variant](pdf_path, out_path, options):
+                now = time.perf_counter()
+                if marker == SETUP:
+                    setup = now - last
+                elif marker == HELD:
+                    hold += now - last
+                    held += 1
+                else:
+                    latencies.append(now - last)
+                last = now
+        except SkipVariant as e:
+            result.update(status='skipped', reason=str(e))
+            return result
+        except Exception as e:
+            result.update(status='error', error=f'{type(e).__name__}: {e}', traceback=traceback.format_exc())
+            return result
+        total = time.perf_counter() - start
+        output_bytes = os.path.getsize(out_path) if os.path.exists(out_path) else 0
+    pages = len(latencies) + held
+    result.update(
+        status='ok',
+        pages=pages,
+        total_s=total,
+        setup_s=setup,
+        # pages released in one batch (main's header/footer window): not part of latency_ms
+        held_pages=held,
+        hold_s=hold if held else None,
+        pages_per_sec=pages / total if total else None,
+        latency_ms={name: (percentile(latencies, q) * 1000 if latencies else None)
+                    for name, q in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))},
+        peak_rss_mb=peak_rss_mb(),
+        peak_rss_children_mb=peak_rss_mb(resource.RUSAGE_CHILDREN),
+        output_bytes=output_bytes,
+    )
+    return result
+
+
+def measure_isolated(variant, pdf_path, options):
+    # A fresh interpreter per run: peak RSS is not inherited from earlier runs
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(measure, variant, pdf_path, options).result()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fmt(value, scale=1):
+    # missing figures (no held pages, every page held) as '-'
+    return '-' if value is None else f'{value * scale:.1f}'
+
+
+def print_summary(results):
+    print(f"{'variant':8} {'document':32} {'pages':>5} {'pages/s':>9} {'hold ms':>9} {'p50 ms':>9} {'p99 ms':>9} "
+          f"{'RSS MB':>8} {'child MB':>8}")
+    for r in results:
+        if r['status'] != 'ok':
+            print(f"{r['variant']:8} {r['document']:32} {r['status']}: {r.get('reason') or r.get('error')}")
+            continue
+        lat = r['latency_ms']
+        print(f"{r['variant']:8} {r['document']:32} {r['pages']:5d} {r['pages_per_sec']:9.2f} "
+              f"{_fmt(r['hold_s'], 1000):>9} {_fmt(lat['p50']):>9} {_fmt(lat['p99']):>9} {r['peak_rss_mb']:8.1f} "
+              f"{r['peak_rss_children_mb']:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the PDF to HTML converter variants')
+    parser.add_argument('--variants', nargs='+', default=VARIANTS, choices=VARIANTS)
+    parser.add_argument('--pages', nargs='*', type=int, default=[10, 50],
+                        help='page counts of the synthetic documents')
+    parser.add_argument('--table-density', type=float, default=0.5, help='mean tables per synthetic page')
+    parser.add_argument('--no-bundled', action='store_true', help='skip the PDFs shipped with the repo')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=1, help='var11 worker processes')
+    parser.add_argument('--chunk-size', type=int, default=16, help='var11 pages per worker task')
+    parser.add_argument('--ocr-dpi', type=int, default=500, help='rasterisation DPI for var8')
+    parser.add_argument('--output', default='bench.json')
+    args = parser.parse_args()
+    options = {'workers': args.workers, 'chunk_size': args.chunk_size, 'ocr_dpi': args.ocr_dpi}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        documents = [] if args.no_bundled else [os.path.join(ROOT, name) for name in BUNDLED_PDFS]
+        for pages in args.pages:
+            path = os.path.join(tmp, f'synthetic_{pages}p_d{args.table_density}.pdf')
+            documents.append(make_document(path, pages, args.table_density))
+        results = []
+        for pdf_path in documents:
+            for variant in args.variants:
+                for run in range(args.repeat):
+                    result = measure_isolated(variant, pdf_path, options)
+                    result['run'] = run
+                    results.append(result)
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'git_commit': git_commit(),
+            'python': sys.version.split()[0],
+            'pymupdf': fitz.VersionBind,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'table_density': args.table_density,
+            'options': options,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print_summary(results)
+    print(f'Results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import random
+
+import fitz  # PyMuPDF
+
+WORDS = ('lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor '
+         'incididunt ut labore et dolore magna aliqua ut enim ad minim veniam quis nostrud '
+         'exercitation ullamco laboris nisi aliquip ex ea commodo consequat').split()
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4
+MARGIN = 60
+FONT_SIZE = 10
+LINE_HEIGHT = 14
+ROW_HEIGHT = 16
+
+
+def _paragraph(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(30, 90))).capitalize() + '.'
+
+
+def _draw_table(page, rng, y):
+    n_rows, n_cols = rng.randint(3, 8), rng.randint(2, 6)
+    x0, x1 = MARGIN, PAGE_WIDTH - MARGIN
+    col_w = (x1 - x0) / n_cols
+    y1 = y + n_rows * ROW_HEIGHT
+    shape = page.new_shape()
+    for r in range(n_rows + 1):
+        shape.draw_line((x0, y + r * ROW_HEIGHT), (x1, y + r * ROW_HEIGHT))
+    for c in range(n_cols + 1):
+        shape.draw_line((x0 + c * col_w, y), (x0 + c * col_w, y1))
+    shape.finish(width=0.5, color=(0, 0, 0))
+    for r in range(n_rows):
+        for c in range(n_cols):
+            text = str(rng.randint(0, 99999)) if r else rng.choice(WORDS)
+            shape.insert_text((x0 + c * col_w + 3, y + r * ROW_HEIGHT + 12), text, fontsize=FONT_SIZE - 1)
+    shape.commit()
+    return y1
+
+
+def make_document(path, pages=10, table_density=0.5, seed=0):
+    """Write a synthetic N-page PDF with prose, ruled tables, a running header and page numbers.
+
+    table_density is the mean number of tables per page (0 = prose only).
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_text((MARGIN, 30), 'Synthetic benchmark report', fontsize=8)
+        page.insert_text((PAGE_WIDTH / 2, PAGE_HEIGHT - 25), str(page_num + 1), fontsize=8)
+        n_tables = int(table_density) + (rng.random() < table_density - int(table_density))
+        items = ['table'] * n_tables + ['par'] * rng.randint(3, 6)
+        rng.shuffle(items)
+        y = MARGIN
+        for item in items:
+            if item == 'table':
+                if y + 8 * ROW_HEIGHT > PAGE_HEIGHT - MARGIN:
+                    continue
+                y = _draw_table(page, rng, y) + LINE_HEIGHT
+            else:
+                text = _paragraph(rng)
+                height = (len(text) // 90 + 2) * LINE_HEIGHT
+                if y + height > PAGE_HEIGHT - MARGIN:
+                    continue
+                rect = fitz.Rect(MARGIN, y, PAGE_WIDTH - MARGIN, y + height)
+                page.insert_textbox(rect, text, fontsize=FONT_SIZE)
+                y += height + LINE_HEIGHT
+    doc.save(path)
+    doc.close()
+    return path
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+
+import fitz  # PyMuPDF
+
+# Table detection cache. Disabled unless a directory is given explicitly or via the environment.
+CACHE_DIR_ENV = 'PDF_TABLE_CACHE_DIR'
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+_digests = {}
+
+
+def file_digest(path):
+    """SHA-256 of the file content, memoized per (path, size, mtime)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _digests.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = _digests[memo_key] = h.hexdigest()
+    return digest
+
+
+def _restore(tables):
+    # JSON has no tuples; bboxes are tuples everywhere else (and used as dict keys)
+    for t in tables:
+        if t.get('bbox') is not None:
+            t['bbox'] = tuple(t['bbox'])
+        if t.get('cell_bboxes') is not None:
+            t['cell_bboxes'] = [tuple(b) if b is not None else None for b in t['cell_bboxes']]
+    return tables
+
+
+class TableCache:
+    """On-disk cache of table detection results.
+
+    Entries are keyed by PDF content hash, page index, engine name and engine
+    parameters, and hold the list of tables found on that page (bbox, cell
+    bboxes, rows, ...). When the directory grows past max_bytes the least
+    recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        directory = os.environ.get(CACHE_DIR_ENV)
+        return cls(directory) if directory else None
+
+    def key(self, digest, page_index, engine, params):
+        raw = json.dumps([digest, page_index, engine, params], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json')
+
+    def get(self, digest, page_index, engine, params):
+        path = self._path(self.key(digest, page_index, engine, params))
+        try:
+            with open(path, encoding='utf-8') as f:
+                tables = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)  # mtime is the LRU clock
+        self.hits += 1
+        return _restore(tables)
+
+    def put(self, digest, page_index, engine, params, tables):
+        path = self._path(self.key(digest, page_index, engine, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(tables, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            self._size += os.path.getsize(path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, st.st_size, st.st_mtime
+
+    def evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        size = sum(e[1] for e in entries)
+        for path, entry_size, _ in entries:
+            if size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= entry_size
+        self._size = size
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+def find_tables(page, cache=None, table_filter=None):
+    """page.find_tables() as a list of dicts, served from cache when possible.
+
+    table_filter (common.table_prefilter.TablePrefilter) is asked only on a
+    cache miss; pages it rules out have no tables and are not cached.
+    """
+    digest = file_digest(page.parent.name) if cache is not None and page.parent.name else None
+    params = {'version': fitz.VersionBind}
+    if digest is not None:
+        tables = cache.get(digest, page.number, 'pymupdf.find_tables', params)
+        if tables is not None:
+            return tables
+    if table_filter is not None and not table_filter.may_have_tables(page):
+        return []
+    tables = []
+    for table in page.find_tables():
+        tables.append({
+            'bbox': tuple(table.bbox),
+            'rows': table.extract(),
+            'cell_bboxes': getattr(table, 'cells', None),
+        })
+    if digest is not None:
+        cache.put(digest, page.number, 'pymupdf.find_tables', params, tables)
+    return tables
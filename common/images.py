@@ -0,0 +1,103 @@
+import hashlib
+import html
+import os
+
+import fitz  # PyMuPDF
+
+# Images smaller than this (in points, either side) are decoration, not content
+MIN_IMAGE_SIZE = 4
+
+
+class ImageStore:
+    """Embedded images written once to a directory next to the HTML.
+
+    Every image xref of the document is extracted at most once; images with
+    the same bytes (a logo or stamp repeated under different xrefs, inline
+    images drawn on every page) are stored as one file, named by content
+    hash. Text extraction never has to carry image bytes: pages are scanned
+    with page.get_image_info(), which does not decode the images.
+    """
+
+    def __init__(self, directory, url_prefix=None, lazy=True):
+        self.directory = directory
+        self.url_prefix = os.path.basename(os.path.normpath(directory)) if url_prefix is None else url_prefix
+        self.lazy = lazy
+        self.by_xref = {}
+        self.by_digest = {}
+        self.by_hash = {}
+        self.extracted = 0
+        self.written = 0
+
+    @classmethod
+    def for_output(cls, html_path, lazy=True):
+        # output.html -> output_images/, referenced relative to the HTML file
+        if not isinstance(html_path, (str, os.PathLike)):
+            return None
+        root, _ = os.path.splitext(os.fspath(html_path))
+        return cls(root + '_images', lazy=lazy)
+
+    def page_images(self, page):
+        """[(bbox, url), ...] for the images drawn on page, in drawing order."""
+        images = []
+        for info in page.get_image_info(hashes=True, xrefs=True):
+            bbox = fitz.Rect(info['bbox']) & page.rect
+            if bbox.is_empty or bbox.width < MIN_IMAGE_SIZE or bbox.height < MIN_IMAGE_SIZE:
+                continue
+            if info['xref']:
+                url = self._from_xref(page.parent, info['xref'])
+            else:
+                url = self._from_inline(page, bbox, info['digest'])
+            if url:
+                images.append((tuple(bbox), url))
+        return images
+
+    def img_tag(self, url, bbox, style='', cls=''):
+        width, height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        attrs = f' class="{cls}"' if cls else ''
+        attrs += f' style="{style}"' if style else ''
+        lazy = ' loading="lazy"' if self.lazy else ''
+        return f'<img src="{html.escape(url)}" width="{width:.0f}" height="{height:.0f}"{lazy}{attrs} alt="">'
+
+    def stats(self):
+        return {'extracted': self.extracted, 'files': self.written}
+
+    def _from_xref(self, doc, xref):
+        if xref not in self.by_xref:
+            self.extracted += 1
+            image = doc.extract_image(xref)
+            if not image:
+                self.by_xref[xref] = None
+            elif image.get('smask'):
+                # transparency lives in a separate mask xref: merge into one PNG
+                pix = fitz.Pixmap(fitz.Pixmap(doc, xref), fitz.Pixmap(doc, image['smask']))
+                self.by_xref[xref] = self._store(self._png_bytes(pix), 'png')
+            else:
+                self.by_xref[xref] = self._store(image['image'], image['ext'])
+        return self.by_xref[xref]
+
+    def _from_inline(self, page, bbox, digest):
+        # inline images have no xref: render their area once per distinct image
+        if digest not in self.by_digest:
+            self.extracted += 1
+            pix = page.get_pixmap(clip=bbox, dpi=150)
+            self.by_digest[digest] = self._store(self._png_bytes(pix), 'png')
+        return self.by_digest[digest]
+
+    @staticmethod
+    def _png_bytes(pix):
+        if pix.n - pix.alpha > 3:  # CMYK
+            pix = fitz.Pixmap(fitz.csRGB, pix)
+        return pix.tobytes('png')
+
+    def _store(self, data, ext):
+        digest = hashlib.sha1(data).hexdigest()[:20]
+        if digest not in self.by_hash:
+            name = f'{digest}.{ext}'
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(data)
+            self.written += 1
+            self.by_hash[digest] = f'{self.url_prefix}/{name}' if self.url_prefix else name
+        return self.by_hash[digest]
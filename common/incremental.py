@@ -0,0 +1,156 @@
+import hashlib
+import importlib.util
+import json
+import os
+import re
+
+from common.cache import file_digest
+
+_REF = re.compile(rb'(\d+) 0 R')
+_PARENT = re.compile(r'/Parent \d+ 0 R')
+
+MANIFEST_VERSION = 1
+
+
+class PageFingerprints:
+    """Content fingerprints of the pages of one open document.
+
+    A page fingerprint covers its page object (contents, resources, boxes,
+    rotation, annotations) and, recursively, every object it references:
+    content streams, fonts, images and form XObjects, hashed from their raw
+    (still compressed) bytes, so nothing is decoded. /Parent links and links
+    to other pages (annotation targets) are not followed, except to pick up
+    resources a page inherits. Each object is hashed once per document, so
+    shared fonts and logos are not re-read for every page.
+    """
+
+    def __init__(self, doc, settings=''):
+        self.doc = doc
+        self.settings = settings
+        self.objects = {}
+        self.page_xrefs = {doc.page_xref(i) for i in range(doc.page_count)}
+
+    def page(self, index):
+        page = self.doc[index]
+        h = hashlib.sha256(self.settings.encode())
+        h.update(self._object(page.xref, root=True).encode())
+        if self.doc.xref_get_key(page.xref, 'Resources')[0] == 'null':
+            # resources inherited from a Pages node
+            parent = self.doc.xref_get_key(page.xref, 'Parent')
+            while parent[0] == 'xref':
+                xref = int(parent[1].split()[0])
+                resources = self.doc.xref_get_key(xref, 'Resources')
+                if resources[0] != 'null':
+                    h.update(resources[1].encode())
+                    for ref in _REF.findall(resources[1].encode()):
+                        h.update(self._object(int(ref)).encode())
+                    break
+                parent = self.doc.xref_get_key(xref, 'Parent')
+        h.update(repr((tuple(page.rect), page.rotation)).encode())
+        return h.hexdigest()
+
+    def _object(self, xref, stack=(), root=False):
+        # digest of an object and everything it references (cycles are cut)
+        if xref in self.page_xrefs and not root:
+            return str(xref)
+        if xref in self.objects:
+            return self.objects[xref]
+        if xref in stack or not 0 < xref < self.doc.xref_length():
+            return ''
+        source = _PARENT.sub('', self.doc.xref_object(xref, compressed=True)).encode()
+        h = hashlib.sha256(source)
+        if self.doc.xref_is_stream(xref):
+            h.update(self.doc.xref_stream_raw(xref) or b'')
+        for ref in _REF.findall(source):
+            h.update(self._object(int(ref), stack + (xref,)).encode())
+        self.objects[xref] = digest = h.hexdigest()
+        return digest
+
+
+def settings_digest(**settings):
+    """Stable digest of converter settings that change the produced HTML."""
+    return hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def source_digests(*modules):
+    """{module name: digest of its source file} for settings_digest, without importing the modules."""
+    return {name: file_digest(importlib.util.find_spec(name).origin) for name in modules}
+
+
+class PageManifest:
+    """Per-page fragments of a previous conversion, kept next to the output.
+
+    output.html.manifest.json lists, for every page, its fingerprint and the
+    file in output.html.pages/ holding the HTML fragment produced for it
+    (plus any extra data a converter wants to keep per page). On the next run
+    a page whose fingerprint is unchanged reuses its fragment instead of being
+    converted again. A different settings digest discards the manifest.
+    """
+
+    def __init__(self, output_path, settings):
+        self.path = os.fspath(output_path) + '.manifest.json'
+        self.fragments_dir = os.fspath(output_path) + '.pages'
+        self.settings = settings
+        self.pages = {}
+        self.new_pages = {}
+        self.reused = 0
+        self.converted = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get('version') != MANIFEST_VERSION or data.get('settings') != self.settings:
+            return
+        self.pages = {int(k): v for k, v in data.get('pages', {}).items()}
+
+    def lookup(self, index, fingerprint):
+        """The stored entry for page index if its fingerprint is unchanged, else None."""
+        entry = self.pages.get(index)
+        if entry is None or entry['fingerprint'] != fingerprint:
+            return None
+        if entry.get('fragment') and not os.path.exists(os.path.join(self.fragments_dir, entry['fragment'])):
+            return None
+        return entry
+
+    def fragment(self, entry):
+        with open(os.path.join(self.fragments_dir, entry['fragment']), encoding='utf-8') as f:
+            return f.read()
+
+    def reuse(self, index, entry):
+        self.new_pages[index] = entry
+        self.reused += 1
+
+    def record(self, index, fingerprint, fragment=None, **extra):
+        """Remember the result for page index; fragment is stored in its own file."""
+        entry = {'fingerprint': fingerprint, **extra}
+        if fragment is not None:
+            entry['fragment'] = f'{index:05d}-{fingerprint[:16]}.html'
+            os.makedirs(self.fragments_dir, exist_ok=True)
+            with open(os.path.join(self.fragments_dir, entry['fragment']), 'w', encoding='utf-8') as f:
+                f.write(fragment)
+        self.new_pages[index] = entry
+        self.converted += 1
+        return entry
+
+    def save(self):
+        """Write the manifest of this run and drop fragment files no page uses any more."""
+        data = {'version': MANIFEST_VERSION, 'settings': self.settings,
+                'pages': {str(k): v for k, v in sorted(self.new_pages.items())}}
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+        used = {e.get('fragment') for e in self.new_pages.values()}
+        if os.path.isdir(self.fragments_dir):
+            for name in os.listdir(self.fragments_dir):
+                if name not in used:
+                    os.remove(os.path.join(self.fragments_dir, name))
+        self.pages = self.new_pages
+        self.new_pages = {}
+
+    def stats(self):
+        return {'reused': self.reused, 'converted': self.converted}
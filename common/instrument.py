@@ -0,0 +1,344 @@
+"""Per-stage timing and optional profiling of the conversion pipeline.
+
+Disabled by default: stage() returns a shared no-op context manager, timed()
+functions add one flag check and debug() does not even format its message.
+
+    from common import instrument
+    instrument.enable(trace=True)
+    with instrument.stage('extract_tables'):
+        ...
+    instrument.write_report('report.json')
+
+From the environment (see configure_from_env): PDF_INSTRUMENT_REPORT,
+PDF_INSTRUMENT_TRACE, PDF_INSTRUMENT_CPROFILE, PDF_INSTRUMENT_TRACEMALLOC,
+PDF_DEBUG.
+
+Worker processes started with init_worker(worker_config()) time, profile and
+trace memory the same way; what they collect travels back with drain() and
+is added to the parent's report, trace and cProfile dump by merge().
+"""
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+class _State:
+    def __init__(self):
+        self.enabled = False
+        self.debug = False
+        self.trace = False
+        self.reset()
+
+    def reset(self):
+        self.stages = defaultdict(lambda: {'calls': 0, 'total_s': 0.0, 'max_s': 0.0})
+        self.pages = defaultdict(lambda: defaultdict(float))
+        self.events = []
+        self.page = None
+        self.profiler = None
+        self.tracemalloc = False
+        self.worker_profiles = []  # cProfile stats dicts of worker processes
+        self.worker_memory = {}  # pid -> tracemalloc figures of a worker process
+        self.origin = time.perf_counter()
+
+
+_state = _State()
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        record(self.name, end - self.start, self.start)
+        return False
+
+
+def enable(trace=False, cprofile=False, memory=False, debug=False):
+    _state.reset()
+    _state.enabled = True
+    _state.trace = trace
+    _state.debug = debug
+    if cprofile:
+        _start_profiler()
+    if memory:
+        _start_tracemalloc()
+
+
+def _start_profiler():
+    _state.profiler = cProfile.Profile()
+    _state.profiler.enable()
+
+
+def _start_tracemalloc():
+    if tracemalloc.is_tracing():
+        # a forked worker inherits the parent's traces
+        tracemalloc.clear_traces()
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    _state.tracemalloc = True
+
+
+def disable():
+    if _state.profiler is not None:
+        _state.profiler.disable()
+    _state.enabled = False
+
+
+def enabled():
+    return _state.enabled
+
+
+def debug_enabled():
+    return _state.debug
+
+
+def set_debug(on=True):
+    _state.debug = on
+
+
+def worker_config():
+    """Settings to hand to a worker process (see init_worker)."""
+    return {'enabled': _state.enabled, 'trace': _state.trace, 'debug': _state.debug, 'origin': _state.origin,
+            'cprofile': _state.profiler is not None, 'memory': _state.tracemalloc}
+
+
+def init_worker(config):
+    # Forked workers inherit the parent's counters and its running profiler: start from a clean state
+    if _state.profiler is not None:
+        _state.profiler.disable()
+    _state.reset()
+    _state.enabled = config['enabled']
+    _state.trace = config['trace']
+    _state.debug = config['debug']
+    _state.origin = config['origin']  # perf_counter is system-wide, keeps trace timestamps aligned
+    if config.get('cprofile'):
+        _start_profiler()
+    if config.get('memory'):
+        _start_tracemalloc()
+
+
+def configure_from_env():
+    report = os.environ.get('PDF_INSTRUMENT_REPORT')
+    trace = os.environ.get('PDF_INSTRUMENT_TRACE')
+    cprofile = os.environ.get('PDF_INSTRUMENT_CPROFILE')
+    memory = bool(os.environ.get('PDF_INSTRUMENT_TRACEMALLOC'))
+    if report or trace or cprofile or memory:
+        enable(trace=bool(trace), cprofile=bool(cprofile), memory=memory)
+    set_debug(bool(os.environ.get('PDF_DEBUG')))
+    return {'report': report, 'trace': trace, 'cprofile': cprofile}
+
+
+def set_page(page_num):
+    """Attribute the following stages to page_num (None = document level)."""
+    _state.page = page_num
+
+
+def stage(name):
+    if not _state.enabled:
+        return _NULL_STAGE
+    return _Stage(name)
+
+
+def record(name, seconds, start=None):
+    if not _state.enabled:
+        return
+    s = _state.stages[name]
+    s['calls'] += 1
+    s['total_s'] += seconds
+    if seconds > s['max_s']:
+        s['max_s'] = seconds
+    if _state.page is not None:
+        _state.pages[_state.page][name] += seconds
+    if _state.trace and start is not None:
+        _state.events.append({
+            'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+            'ts': (start - _state.origin) * 1e6, 'dur': seconds * 1e6,
+            'args': {'page': _state.page},
+        })
+
+
+def timed(name=None):
+    """Decorator: time every call of the function as stage `name`."""
+    def decorate(fn):
+        stage_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            with _Stage(stage_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def debug(msg, *args):
+    """print('DEBUG: ...') only when debug output is on; args are formatted lazily."""
+    if _state.debug:
+        print('DEBUG: ' + (msg % args if args else msg))
+
+
+def snapshot():
+    """Stage and page timings collected so far, as plain data (for merging across processes)."""
+    return {
+        'stages': {k: dict(v) for k, v in _state.stages.items()},
+        'pages': {p: dict(v) for p, v in _state.pages.items()},
+        'events': list(_state.events),
+    }
+
+
+def _memory_figures():
+    current, peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics('lineno')[:20]
+    return {
+        'current_bytes': current,
+        'peak_bytes': peak,
+        'top': [{'where': str(stat.traceback), 'bytes': stat.size, 'count': stat.count} for stat in top],
+    }
+
+
+def drain():
+    """snapshot() and start over; in a worker also its cProfile stats and memory figures."""
+    data = snapshot()
+    _state.stages.clear()
+    _state.pages.clear()
+    _state.events.clear()
+    if _state.profiler is not None:
+        _state.profiler.disable()
+        _state.profiler.create_stats()
+        data['cprofile'] = _state.profiler.stats
+        _start_profiler()  # a fresh profiler, so the next drain() does not repeat these calls
+    if _state.tracemalloc:
+        data['memory'] = {'pid': os.getpid(), **_memory_figures()}
+    return data
+
+
+def merge(data):
+    """Add timings collected in another process (see drain())."""
+    for name, s in data['stages'].items():
+        own = _state.stages[name]
+        own['calls'] += s['calls']
+        own['total_s'] += s['total_s']
+        own['max_s'] = max(own['max_s'], s['max_s'])
+    for page, stages in data['pages'].items():
+        for name, seconds in stages.items():
+            _state.pages[page][name] += seconds
+    _state.events.extend(data['events'])
+    if data.get('cprofile'):
+        _state.worker_profiles.append(data['cprofile'])
+    memory = data.get('memory')
+    if memory:
+        # the peak over all chunks of the worker, the allocations of its latest chunk
+        seen = _state.worker_memory.get(memory['pid'])
+        if seen is not None and seen['peak_bytes'] > memory['peak_bytes']:
+            memory = {**memory, 'peak_bytes': seen['peak_bytes']}
+        _state.worker_memory[memory['pid']] = memory
+
+
+def report():
+    data = {
+        'wall_s': time.perf_counter() - _state.origin,
+        'stages': {
+            name: {
+                'calls': s['calls'],
+                'total_s': s['total_s'],
+                'mean_ms': s['total_s'] / s['calls'] * 1000 if s['calls'] else 0.0,
+                'max_ms': s['max_s'] * 1000,
+            }
+            for name, s in sorted(_state.stages.items(), key=lambda kv: -kv[1]['total_s'])
+        },
+        'pages': {str(p): dict(v) for p, v in sorted(_state.pages.items())},
+    }
+    if _state.tracemalloc:
+        data['memory'] = _memory_figures()
+        if _state.worker_memory:
+            data['memory']['workers'] = {
+                str(pid): {k: v for k, v in m.items() if k != 'pid'} for pid, m in sorted(_state.worker_memory.items())}
+    return data
+
+
+def write_report(path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(), f, indent=2)
+
+
+def write_trace(path):
+    # Chrome trace event format: open in chrome://tracing or ui.perfetto.dev
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': _state.events, 'displayTimeUnit': 'ms'}, f)
+
+
+class _ProfileData:
+    # stats dict of another process in the shape pstats.Stats() loads from
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def write_cprofile(path):
+    """cProfile stats of this process and of the workers merged so far, in one file."""
+    if _state.profiler is None:
+        return
+    _state.profiler.disable()
+    _state.profiler.create_stats()
+    profiles = [p for p in [_state.profiler.stats, *_state.worker_profiles] if p]
+    if not profiles:
+        return
+    stats = pstats.Stats(_ProfileData(profiles[0]))
+    for profile in profiles[1:]:
+        stats.add(_ProfileData(profile))
+    stats.dump_stats(path)
+
+
+def print_memory_summary(limit=10):
+    """Peak traced memory of this process and the workers, and the largest allocation sites."""
+    memory = report()['memory']
+    print(f"tracemalloc: peak {memory['peak_bytes'] / 2**20:.1f} MB, current {memory['current_bytes'] / 2**20:.1f} MB")
+    for pid, m in memory.get('workers', {}).items():
+        print(f"  worker {pid}: peak {m['peak_bytes'] / 2**20:.1f} MB")
+    tops = [memory['top'], *(m['top'] for m in memory.get('workers', {}).values())]
+    for stat in sorted((s for top in tops for s in top), key=lambda s: -s['bytes'])[:limit]:
+        print(f"  {stat['bytes'] / 2**10:10.1f} KB {stat['count']:8d}  {stat['where']}")
+
+
+def finish(report_path=None, trace=None, cprofile=None):
+    """Write whatever outputs were requested and stop profiling."""
+    if report_path:
+        write_report(report_path)
+    elif _state.tracemalloc:
+        print_memory_summary()  # tracemalloc without a report: the figures would be lost otherwise
+    if trace:
+        write_trace(trace)
+    if cprofile:
+        write_cprofile(cprofile)
+    if _state.tracemalloc:
+        tracemalloc.stop()
+        _state.tracemalloc = False
+    disable()
@@ -0,0 +1,229 @@
+import numpy as np
+
+from common.page_analysis import TEXT_FLAGS
+
+# Rulings closer than this (points) are one line; collinear pieces with gaps up
+# to JOIN_TOLERANCE are joined; a horizontal and a vertical ruling meet when
+# they pass within INTERSECTION_TOLERANCE of each other
+SNAP_TOLERANCE = 3.0
+JOIN_TOLERANCE = 3.0
+INTERSECTION_TOLERANCE = 3.0
+# Shorter segments are not rulings (underlines of single characters, dots)
+EDGE_MIN_LENGTH = 3.0
+# A grid with fewer cells is a framed paragraph, not a table
+MIN_CELLS = 2
+
+
+def ruling_segments(drawings, min_length=EDGE_MIN_LENGTH, tol=SNAP_TOLERANCE):
+    """Horizontal (y, x0, x1) and vertical (x, y0, y1) segments of page.get_cdrawings() paths.
+
+    Lines are kept when axis-parallel, rectangles (and quads, by their bbox)
+    give their four edges, or one ruling when thinner than tol.
+    """
+    horizontal, vertical = [], []
+    for path in drawings:
+        for item in path['items']:
+            kind = item[0]
+            if kind == 'l':
+                (x0, y0), (x1, y1) = item[1], item[2]
+                if abs(y1 - y0) <= tol:
+                    horizontal.append(((y0 + y1) / 2, min(x0, x1), max(x0, x1)))
+                elif abs(x1 - x0) <= tol:
+                    vertical.append(((x0 + x1) / 2, min(y0, y1), max(y0, y1)))
+                continue
+            if kind == 're':
+                x0, y0, x1, y1 = item[1]
+            elif kind == 'qu':
+                xs = [p[0] for p in item[1]]
+                ys = [p[1] for p in item[1]]
+                x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+            else:
+                continue
+            x0, x1 = min(x0, x1), max(x0, x1)
+            y0, y1 = min(y0, y1), max(y0, y1)
+            if y1 - y0 <= tol:
+                horizontal.append(((y0 + y1) / 2, x0, x1))
+            elif x1 - x0 <= tol:
+                vertical.append(((x0 + x1) / 2, y0, y1))
+            else:
+                horizontal += [(y0, x0, x1), (y1, x0, x1)]
+                vertical += [(x0, y0, y1), (x1, y0, y1)]
+    horizontal = np.array(horizontal, dtype=float).reshape(-1, 3)
+    vertical = np.array(vertical, dtype=float).reshape(-1, 3)
+    return (horizontal[horizontal[:, 2] - horizontal[:, 1] >= min_length],
+            vertical[vertical[:, 2] - vertical[:, 1] >= min_length])
+
+
+def merge_segments(segments, snap=SNAP_TOLERANCE, join=JOIN_TOLERANCE):
+    """Snap (pos, start, end) segments to common positions and join overlapping pieces.
+
+    Positions that follow each other within snap form one line at their mean
+    position; on each line, pieces that overlap or leave gaps up to join
+    become one segment.
+    """
+    if not len(segments):
+        return segments
+    segments = segments[np.argsort(segments[:, 0], kind='stable')]
+    line = np.concatenate(([0], np.cumsum(np.diff(segments[:, 0]) > snap)))
+    position = np.bincount(line, weights=segments[:, 0]) / np.bincount(line)
+    segments = np.column_stack((position[line], segments[:, 1], segments[:, 2]))
+    order = np.lexsort((segments[:, 1], line))
+    segments, line = segments[order], line[order]
+    # lines are laid out one after another (offset) so one running maximum serves all of them
+    offset = line * (segments[:, 2].max() - segments[:, 1].min() + 2 * join + 1)
+    reach = np.maximum.accumulate(segments[:, 2] + offset)
+    starts = np.ones(len(segments), dtype=bool)
+    starts[1:] = segments[1:, 1] + offset[1:] > reach[:-1] + join
+    first = np.flatnonzero(starts)
+    return np.column_stack((segments[first, 0], segments[first, 1], np.maximum.reduceat(segments[:, 2], first)))
+
+
+def _components(touch):
+    # connected groups of horizontal/vertical rulings that cross each other
+    unseen_h = np.ones(touch.shape[0], dtype=bool)
+    components = []
+    while unseen_h.any():
+        in_h = np.zeros_like(unseen_h)
+        in_h[np.argmax(unseen_h)] = True
+        in_v = np.zeros(touch.shape[1], dtype=bool)
+        while True:
+            more_v = touch[in_h].any(axis=0) & ~in_v
+            in_v |= more_v
+            more_h = touch[:, more_v].any(axis=1) & ~in_h
+            if not more_h.any():
+                break
+            in_h |= more_h
+        unseen_h &= ~in_h
+        components.append((in_h, in_v))
+    return components
+
+
+def _close_sides(h, v, tol):
+    # Open-sided tables (rules run past the outer column lines, no frame): where
+    # two or more rulings end at the outermost position and no crossing ruling
+    # is there, their ends become the missing outer border
+    def borders(rules, crossing):
+        found = []
+        for position, ends in ((rules[:, 1].min(), rules[:, 1]), (rules[:, 2].max(), rules[:, 2])):
+            if np.abs(crossing[:, 0] - position).min() > tol:
+                at = rules[np.abs(ends - position) <= tol, 0]
+                if len(at) >= 2:
+                    found.append((position, at.min(), at.max()))
+        return np.array(found, dtype=float).reshape(-1, 3)
+
+    return np.vstack((h, borders(v, h))), np.vstack((v, borders(h, v)))
+
+
+def _grid_cells(h, v, tol):
+    # Cells of one ruling grid: (row0, col0, row1, col1) index ranges over the
+    # distinct ruling positions ys/xs, merged across missing inner borders
+    def borders(xs, ys):
+        # [k, i]: a ruling at position k passes through the middle of band i
+        row_mid = (ys[:-1] + ys[1:]) / 2
+        col_mid = (xs[:-1] + xs[1:]) / 2
+        v_border = np.zeros((len(xs), len(row_mid)), dtype=int)
+        np.add.at(v_border, np.searchsorted(xs, v[:, 0]),
+                  (v[:, 1:2] - tol <= row_mid) & (v[:, 2:3] + tol >= row_mid))
+        h_border = np.zeros((len(ys), len(col_mid)), dtype=int)
+        np.add.at(h_border, np.searchsorted(ys, h[:, 0]),
+                  (h[:, 1:2] - tol <= col_mid) & (h[:, 2:3] + tol >= col_mid))
+        return v_border, h_border
+
+    ys = np.unique(h[:, 0])
+    xs = np.unique(v[:, 0])
+    v_border, h_border = borders(xs, ys)
+    # stubs that border no band would leave rows / columns covered by merged cells only
+    keep_x, keep_y = v_border.any(axis=1), h_border.any(axis=1)
+    keep_x[[0, -1]] = keep_y[[0, -1]] = True
+    if not keep_x.all() or not keep_y.all():
+        xs, ys = xs[keep_x], ys[keep_y]
+        h, v = h[np.isin(h[:, 0], ys)], v[np.isin(v[:, 0], xs)]
+        v_border, h_border = borders(xs, ys)
+    n_rows, n_cols = len(ys) - 1, len(xs) - 1
+    open_right = v_border[1:-1].T == 0  # (n_rows, n_cols - 1): no border between col j and j + 1
+    open_down = h_border[1:-1] == 0  # (n_rows - 1, n_cols): no border between row i and i + 1
+    # label propagation: every grid unit takes the smallest label it is connected to
+    labels = np.arange(n_rows * n_cols).reshape(n_rows, n_cols)
+    while True:
+        new = labels.copy()
+        new[:, :-1] = np.where(open_right, np.minimum(new[:, :-1], labels[:, 1:]), new[:, :-1])
+        new[:, 1:] = np.where(open_right, np.minimum(new[:, 1:], labels[:, :-1]), new[:, 1:])
+        new[:-1] = np.where(open_down, np.minimum(new[:-1], labels[1:]), new[:-1])
+        new[1:] = np.where(open_down, np.minimum(new[1:], labels[:-1]), new[1:])
+        if (new == labels).all():
+            break
+        labels = new
+    # bounding index ranges of the units sharing a label
+    order = np.argsort(labels, axis=None, kind='stable')
+    first = np.flatnonzero(np.diff(labels.ravel()[order], prepend=-1))
+    rows, cols = np.divmod(order, n_cols)
+    cells = zip(np.minimum.reduceat(rows, first).tolist(), np.minimum.reduceat(cols, first).tolist(),
+                (np.maximum.reduceat(rows, first) + 1).tolist(), (np.maximum.reduceat(cols, first) + 1).tolist())
+    return xs, ys, labels, sorted(cells)
+
+
+def find_lattice_tables(page, text_dict=None, drawings=None):
+    """Ruled tables of page from its vector drawings, without rendering it.
+
+    Returns [{'bbox', 'rows', 'cell_bboxes'}, ...] in PyMuPDF page
+    coordinates (origin top left), like common.cache.find_tables: rows is
+    the grid of cell texts with None where a merged cell covers a position,
+    cell_bboxes the cell bboxes sorted like PyMuPDF's Table.cells. Text is
+    taken from the spans of text_dict (page.get_text('dict')) whose centre
+    lies in a cell; lines inside one cell are separated by newlines. Grids
+    with no text in any cell are not tables.
+    """
+    if drawings is None:
+        drawings = page.get_cdrawings()
+    h, v = ruling_segments(drawings)
+    h, v = merge_segments(h), merge_segments(v)
+    if len(h) < 2 or len(v) < 2:
+        return []
+    tol = INTERSECTION_TOLERANCE
+    touch = ((v[None, :, 0] >= h[:, None, 1] - tol) & (v[None, :, 0] <= h[:, None, 2] + tol)
+             & (h[:, None, 0] >= v[None, :, 1] - tol) & (h[:, None, 0] <= v[None, :, 2] + tol))
+    grids = []
+    for in_h, in_v in _components(touch):
+        if in_h.sum() >= 2 and in_v.sum() >= 2:
+            xs, ys, labels, cells = _grid_cells(*_close_sides(h[in_h], v[in_v], tol), tol)
+            if len(cells) >= MIN_CELLS:
+                grids.append((xs, ys, labels, cells))
+    if not grids:
+        return []
+
+    if text_dict is None:
+        text_dict = page.get_text('dict', flags=TEXT_FLAGS)
+    spans = [(line_no, s['text'], s['bbox']) for line_no, line in enumerate(
+        l for b in text_dict['blocks'] if b['type'] == 0 for l in b['lines']) for s in line['spans']]
+    centers = np.array([((b[0] + b[2]) / 2, (b[1] + b[3]) / 2) for _, _, b in spans], dtype=float).reshape(-1, 2)
+    taken = np.zeros(len(spans), dtype=bool)
+
+    tables = []
+    for xs, ys, labels, cells in sorted(grids, key=lambda g: (g[1][0], g[0][0])):
+        cell_of_label = {labels[r0, c0]: n for n, (r0, c0, r1, c1) in enumerate(cells)}
+        col = np.searchsorted(xs, centers[:, 0], side='right') - 1
+        row = np.searchsorted(ys, centers[:, 1], side='right') - 1
+        inside = ~taken & (col >= 0) & (col < len(xs) - 1) & (row >= 0) & (row < len(ys) - 1)
+        if not inside.any():
+            continue  # crossing rules without text: chart gridlines, a '#', not a table
+        taken |= inside
+        texts = [[] for _ in cells]
+        last_line = [None] * len(cells)
+        for i in np.flatnonzero(inside):
+            n = cell_of_label[labels[row[i], col[i]]]
+            line_no, text, _ = spans[i]
+            if last_line[n] is not None and last_line[n] != line_no:
+                texts[n].append('\n')
+            texts[n].append(text)
+            last_line[n] = line_no
+        grid = [[None] * (len(xs) - 1) for _ in range(len(ys) - 1)]
+        cell_bboxes = []
+        for n, (r0, c0, r1, c1) in enumerate(cells):
+            grid[r0][c0] = ''.join(texts[n]).strip()
+            cell_bboxes.append((float(xs[c0]), float(ys[r0]), float(xs[c1]), float(ys[r1])))
+        tables.append({
+            'bbox': (float(xs[0]), float(ys[0]), float(xs[-1]), float(ys[-1])),
+            'rows': grid,
+            'cell_bboxes': sorted(cell_bboxes),
+        })
+    return tables
@@ -0,0 +1,165 @@
+import sys
+
+import numpy as np
+
+# Compact text layout of a page: __slots__ objects instead of a dict per span,
+# with line and block bboxes computed once when the layout is built.
+
+
+class Span:
+    __slots__ = ('text', 'size', 'font', 'x0', 'y0', 'x1', 'y1')
+
+    def __init__(self, text, size, font, x0, y0, x1, y1):
+        self.text = text
+        self.size = size
+        self.font = font
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+
+    @property
+    def bbox(self):
+        return (self.x0, self.y0, self.x1, self.y1)
+
+    def __repr__(self):
+        return f'Span({self.text!r}, {self.size:g}, {self.font!r}, {self.bbox})'
+
+
+class _Group:
+    # A sequence of items with the union bbox of their bboxes
+    __slots__ = ('items', 'x0', 'y0', 'x1', 'y1')
+
+    def __init__(self, items):
+        self.items = items
+        first = items[0]
+        x0, y0, x1, y1 = first.x0, first.y0, first.x1, first.y1
+        for i in items:
+            if i.x0 < x0:
+                x0 = i.x0
+            if i.y0 < y0:
+                y0 = i.y0
+            if i.x1 > x1:
+                x1 = i.x1
+            if i.y1 > y1:
+                y1 = i.y1
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+
+    @property
+    def bbox(self):
+        return (self.x0, self.y0, self.x1, self.y1)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+
+class Line(_Group):
+    """Spans of one text line in PDF order; iterating a line yields its spans."""
+    __slots__ = ()
+
+    @property
+    def text(self):
+        return ''.join(s.text for s in self.items)
+
+    def __repr__(self):
+        return f'Line({self.text!r}, {self.bbox})'
+
+
+class Block(_Group):
+    """Lines of one text block; iterating a block yields its lines."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return f'Block({len(self.items)} lines, {self.bbox})'
+
+
+class TextLine:
+    """Text of a whole line with its bbox (main.py works on lines, not spans)."""
+    __slots__ = ('x0', 'y0', 'x1', 'y1', 'text')
+
+    def __init__(self, x0, y0, x1, y1, text):
+        self.x0 = x0
+        self.y0 = y0
+        self.x1 = x1
+        self.y1 = y1
+        self.text = text
+
+    def __repr__(self):
+        return f'TextLine({self.text!r}, {(self.x0, self.y0, self.x1, self.y1)})'
+
+
+def page_blocks(text_dict):
+    """Blocks of a get_text('dict') result; whitespace-only spans, empty lines and image blocks are dropped.
+
+    Font names are interned: a page has a handful of fonts and thousands of spans.
+    """
+    blocks = []
+    intern = sys.intern
+    for block in text_dict['blocks']:
+        if block['type'] != 0:
+            continue
+        lines = []
+        for line in block['lines']:
+            spans = [Span(s['text'], s['size'], intern(s['font']), *s['bbox'])
+                     for s in line['spans'] if s['text'].strip()]
+            if spans:
+                lines.append(Line(spans))
+        if lines:
+            blocks.append(Block(lines))
+    return blocks
+
+
+def paragraphs(blocks, indent_tol=20, break_factor=1.5):
+    """Split every block of a page into paragraphs at once; returns the paragraphs in block order.
+
+    A new paragraph starts where the gap between the tops of consecutive lines
+    exceeds break_factor times the block's median gap (the upper median,
+    sorted(gaps)[n // 2]), or where a line is indented by more than
+    indent_tol relative to the previous one. Gaps, indents and the per-block
+    medians are computed for all lines of the page in a few array operations.
+    """
+    lines = [line for block in blocks for line in block]
+    if not lines:
+        return []
+    counts = np.fromiter((len(b) for b in blocks), dtype=np.intp, count=len(blocks))
+    block_of = np.repeat(np.arange(len(blocks)), counts)
+    ys = np.fromiter((l.y0 for l in lines), dtype=float, count=len(lines))
+    xs = np.fromiter((l.x0 for l in lines), dtype=float, count=len(lines))
+    gaps = np.diff(ys)
+    indents = np.diff(xs)
+    inside = block_of[1:] == block_of[:-1]  # gap i lies between lines i and i + 1 of one block
+    # per-block upper median of the gaps: sort by (block, gap), take element n // 2 of each run
+    n_gaps = counts - 1
+    first_gap = np.cumsum(n_gaps) - n_gaps
+    block_gaps = gaps[inside]
+    sorted_gaps = block_gaps[np.lexsort((block_gaps, block_of[1:][inside]))]
+    median = np.full(len(blocks), 12.0)
+    has_gaps = n_gaps > 0
+    median[has_gaps] = sorted_gaps[first_gap[has_gaps] + n_gaps[has_gaps] // 2]
+    breaks = ~inside | (gaps > break_factor * median[block_of[1:]]) | (indents > indent_tol)
+    bounds = [0, *(np.flatnonzero(breaks) + 1).tolist(), len(lines)]
+    return [lines[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def alignments(paragraphs, page_width=650):
+    """'left' / 'center' / 'right' for each paragraph from the extents of its lines.
+
+    Centered when the left and right margins differ by less than 8% of the
+    page width, right-aligned when the right margin is under 15%.
+    """
+    if not paragraphs:
+        return []
+    lines = [line for p in paragraphs for line in p]
+    starts = np.cumsum([0] + [len(p) for p in paragraphs[:-1]])
+    x0 = np.minimum.reduceat(np.fromiter((l.x0 for l in lines), dtype=float, count=len(lines)), starts)
+    x1 = np.maximum.reduceat(np.fromiter((l.x1 for l in lines), dtype=float, count=len(lines)), starts)
+    right_margin = page_width - x1
+    center = np.abs(x0 - right_margin) < page_width * 0.08
+    right = right_margin < page_width * 0.15
+    return np.select([center, right], ['center', 'right'], 'left').tolist()
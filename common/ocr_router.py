@@ -0,0 +1,118 @@
+"""Route pages and image regions without a text layer through the var8 OCR.
+
+Digital pages never reach OCR. A page with no extractable text is OCR'd as a
+whole when images cover most of it (a scan); blank pages and pages of vector
+graphics only are left alone. Otherwise only image blocks large
+enough to matter and with no text line drawn over them (scanned annexes, tables
+pasted as pictures) are rendered and OCR'd. The results come back in PDF
+coordinates so converters can merge them into their own element stream:
+
+    lines:  [(x0, y0, x1, y1, text, size), ...]    one entry per OCR text line
+    tables: [{'bbox', 'rows', 'cell_bboxes'}, ...]  same shape as common.cache.find_tables
+
+var8 (OpenCV, pytesseract) is imported on first use only.
+"""
+from common import instrument
+from common.spatial import BBoxIndex
+
+# Render resolution for OCR regions
+OCR_DPI = 300
+# Image blocks smaller than this fraction of the page area are left alone
+MIN_IMAGE_AREA = 0.02
+# A page without text is a scan when its images cover this fraction of it
+MIN_SCAN_COVERAGE = 0.5
+
+
+class OcrRouter:
+    """Decides what to OCR on a page and runs var8 on it.
+
+    pages/regions count the OCR work done, skipped the pages that needed none.
+    """
+
+    def __init__(self, dpi=OCR_DPI, min_image_area=MIN_IMAGE_AREA, min_scan_coverage=MIN_SCAN_COVERAGE):
+        self.dpi = dpi
+        self.min_image_area = min_image_area
+        self.min_scan_coverage = min_scan_coverage
+        self.pages = 0
+        self.regions = 0
+        self.skipped = 0
+
+    def route(self, analysis):
+        """Rects of the page that need OCR: [page.rect], image regions or []."""
+        page_area = analysis.rect.width * analysis.rect.height
+        text_lines = [line for line in analysis.lines if line[4].strip()]
+        if not text_lines:
+            # scans are often tiled into strips, so the images are summed up
+            covered = sum(abs(analysis.rect & image['bbox']) for image in analysis.images)
+            if page_area and covered >= self.min_scan_coverage * page_area:
+                return [analysis.rect]
+        min_area = self.min_image_area * page_area
+        line_index = BBoxIndex([line[:4] for line in text_lines])
+        regions = []
+        for image in analysis.images:
+            x0, y0, x1, y1 = image['bbox']
+            if (x1 - x0) * (y1 - y0) < min_area:
+                continue
+            if any(_center_inside(text_lines[i], (x0, y0, x1, y1)) for i in line_index.candidates((x0, y0, x1, y1))):
+                continue  # text drawn over the image: it already has a text layer
+            regions.append(analysis.rect & (x0, y0, x1, y1))
+        return [r for r in regions if not r.is_empty]
+
+    def ocr_page(self, analysis):
+        """OCR everything route() selects; returns (lines, tables) in PDF coordinates."""
+        regions = self.route(analysis)
+        if not regions:
+            self.skipped += 1
+            return [], []
+        self.pages += 1
+        lines, tables = [], []
+        with instrument.stage('ocr'):
+            for clip in regions:
+                self.regions += 1
+                region_lines, region_tables = ocr_region(analysis.page, clip, self.dpi)
+                lines.extend(region_lines)
+                tables.extend(region_tables)
+        return lines, tables
+
+    def stats(self):
+        return {'pages': self.pages, 'regions': self.regions, 'skipped': self.skipped}
+
+
+def _center_inside(line, bbox):
+    cx, cy = (line[0] + line[2]) / 2, (line[1] + line[3]) / 2
+    return bbox[0] <= cx <= bbox[2] and bbox[1] <= cy <= bbox[3]
+
+
+def ocr_region(page, clip, dpi=OCR_DPI):
+    """Render clip of page, find ruled tables and OCR text and cells."""
+    from var8.main import detect_table_cells, read_free_words, read_region_cells, render_page_image, table_regions
+
+    img = render_page_image(page, dpi, clip)
+    scale = 72 / dpi
+
+    def to_pdf(x0, y0, x1, y1):
+        return (clip.x0 + x0 * scale, clip.y0 + y0 * scale, clip.x0 + x1 * scale, clip.y0 + y1 * scale)
+
+    # OCR_DPI is well below var8's DPI: lines are thin, look for them at full size
+    grid, mask = detect_table_cells(img, scale=1)
+    words_by_line = {}
+    for w in read_free_words(img, mask):
+        words_by_line.setdefault(w['line'], []).append(w)
+    lines = []
+    for words in words_by_line.values():
+        x0 = min(w['x'] for w in words)
+        y0 = min(w['y'] for w in words)
+        x1 = max(w['x'] + w['w'] for w in words)
+        y1 = max(w['y'] + w['h'] for w in words)
+        text = ' '.join(w['text'] for w in words)
+        lines.append((*to_pdf(x0, y0, x1, y1), text, (y1 - y0) * scale))
+
+    tables = []
+    for (rx0, ry0, rx1, ry1), rows in table_regions(grid):
+        texts = read_region_cells(img, grid, (rx0, ry0, rx1, ry1), rows)
+        tables.append({
+            'bbox': to_pdf(rx0, ry0, rx1, ry1),
+            'rows': [[texts.get((r, c), '') for c in range(len(grid[r]))] for r in rows],
+            'cell_bboxes': [to_pdf(x, y, x + w, y + h) for r in rows for x, y, w, h in grid[r]],
+        })
+    return lines, tables
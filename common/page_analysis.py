@@ -0,0 +1,87 @@
+from functools import cached_property
+
+import fitz  # PyMuPDF
+
+from common.cache import find_tables
+
+_CACHED = ('text_dict', 'blocks', 'lines', 'drawings', 'tables', 'images')
+
+# get_text('dict') defaults without TEXT_PRESERVE_IMAGES: image bytes are not
+# decoded into the text dict, images are listed by PageAnalysis.images instead
+TEXT_FLAGS = fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES
+
+
+class PageAnalysis:
+    """PyMuPDF extraction results for one page, computed lazily and at most once.
+
+    Every consumer of a page (table rendering, paragraph grouping, page number
+    detection, ...) reads the same text dict, block list, drawings and tables
+    instead of calling page.get_text()/find_tables() again. Call release()
+    when the page is done so the results can be garbage collected.
+    With a table_filter (common.table_prefilter.TablePrefilter) pages it
+    rules out get no table detection at all.
+    """
+
+    def __init__(self, page, table_cache=None, text_flags=None, table_filter=None):
+        self.page = page
+        self.number = page.number
+        self.rect = page.rect
+        self.table_cache = table_cache
+        self.text_flags = text_flags
+        self.table_filter = table_filter
+
+    @cached_property
+    def text_dict(self):
+        return self.page.get_text('dict', flags=TEXT_FLAGS if self.text_flags is None else self.text_flags)
+
+    @cached_property
+    def blocks(self):
+        # Same tuples as page.get_text('blocks'), built from the text dict;
+        # image blocks (only with TEXT_PRESERVE_IMAGES in text_flags) carry an empty text
+        blocks = []
+        for b in self.text_dict['blocks']:
+            if b['type'] == 0:
+                text = ''.join(''.join(s['text'] for s in l['spans']) + '\n' for l in b['lines'])
+            else:
+                text = ''
+            blocks.append((*b['bbox'], text, b['number'], b['type']))
+        return blocks
+
+    @cached_property
+    def lines(self):
+        # (x0, y0, x1, y1, text) for every text line
+        lines = []
+        for b in self.text_dict['blocks']:
+            if b['type'] != 0:
+                continue
+            for l in b['lines']:
+                lines.append((*l['bbox'], ''.join(s['text'] for s in l['spans'])))
+        return lines
+
+    @cached_property
+    def images(self):
+        # bbox/xref/size of every image on the page, without decoding them
+        return self.page.get_image_info(xrefs=True)
+
+    @cached_property
+    def drawings(self):
+        return self.page.get_drawings()
+
+    @cached_property
+    def tables(self):
+        return find_tables(self.page, self.table_cache, self.table_filter)
+
+    def release(self):
+        for name in _CACHED:
+            self.__dict__.pop(name, None)
+        self.page = None
+
+
+def iter_page_analyses(doc, table_cache=None, text_flags=None, table_filter=None):
+    """Yield a PageAnalysis per page; each one is released once the caller moves on."""
+    for page in doc:
+        analysis = PageAnalysis(page, table_cache, text_flags, table_filter)
+        try:
+            yield analysis
+        finally:
+            analysis.release()
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+# In-memory budget of the rendered page fragments kept by PageCache (in characters)
+PAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Per-document data (header/footer sets, ...) kept for this many documents
+PAGE_CACHE_MAX_DOCUMENTS = 64
+
+
+def parse_pages(spec, page_count):
+    """'1-3,7' -> [0, 1, 2, 6]: 1-based page ranges to sorted 0-based page indices.
+
+    Open ranges ('5-', '-3') run to the last / from the first page; pages
+    past the end of the document are dropped.
+    """
+    pages = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition('-')
+        first = int(first) if first.strip() else 1
+        if not dash:
+            last = first
+        else:
+            last = int(last) if last.strip() else None
+        if first < 1 or last is not None and last < first:
+            raise ValueError(f'bad page range {part!r}')
+        # an open end runs to the last page, even when that is before first (nothing then)
+        pages.update(range(first - 1, page_count if last is None else min(last, page_count)))
+    return sorted(pages)
+
+
+class PageCache:
+    """Bounded in-memory LRU of rendered page fragments.
+
+    Fragments are keyed by (document digest, engine, settings digest, page
+    index), so an edited document or other converter settings never hit an
+    old entry. When the fragments exceed max_bytes the least recently used
+    ones are dropped. Small per-document results that every page range
+    needs (header/footer sets) are kept for the last max_documents
+    documents. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes=PAGE_CACHE_MAX_BYTES, max_documents=PAGE_CACHE_MAX_DOCUMENTS):
+        self.max_bytes = max_bytes
+        self.max_documents = max_documents
+        self.fragments = OrderedDict()
+        self.documents = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def get_pages(self, key, pages, convert):
+        """Fragments of pages (0-based indices) in the given order.
+
+        key identifies the document and settings, e.g. (digest, engine, settings);
+        convert(missing) is called once with the sorted indices that are not
+        cached and must return their fragments in that order.
+        """
+        found = {}
+        with self.lock:
+            # a page asked for twice is looked up and counted once
+            for i in dict.fromkeys(pages):
+                fragment = self.fragments.get(key + (i,))
+                if fragment is not None:
+                    self.fragments.move_to_end(key + (i,))
+                    found[i] = fragment
+            missing = sorted(set(pages) - found.keys())
+            self.hits += len(found)
+            self.misses += len(missing)
+        if missing:
+            converted = dict(zip(missing, convert(missing)))
+            found.update(converted)
+            with self.lock:
+                for i, fragment in converted.items():
+                    self._put(key + (i,), fragment)
+        return [found[i] for i in pages]
+
+    def _put(self, key, fragment):
+        old = self.fragments.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        if len(fragment) > self.max_bytes:
+            return
+        self.fragments[key] = fragment
+        self.size += len(fragment)
+        while self.size > self.max_bytes:
+            _, dropped = self.fragments.popitem(last=False)
+            self.size -= len(dropped)
+            self.evicted += 1
+
+    def document(self, key, compute):
+        """Per-document value for key, computed by compute() on first use."""
+        with self.lock:
+            if key in self.documents:
+                self.documents.move_to_end(key)
+                return self.documents[key]
+        value = compute()
+        with self.lock:
+            self.documents[key] = value
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.fragments.clear()
+            self.documents.clear()
+            self.size = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evicted': self.evicted,
+                'pages': len(self.fragments), 'bytes': self.size}
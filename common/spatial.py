@@ -0,0 +1,93 @@
+import math
+from collections import defaultdict
+
+# Grid cell size in PDF points
+CELL_SIZE = 32.0
+# Extra margin for candidate lookup so float rounding never drops a match;
+# the final decision is always made by the exact comparison below
+_PAD = 1.0
+
+
+class BBoxIndex:
+    """Uniform-grid index over the table bboxes of one page.
+
+    Answers "does this line/block overlap or lie inside any table" without
+    comparing it against every table. Candidates come from the grid cells the
+    query touches; each candidate is then checked with exactly the same
+    tolerance test the converters used before, so the answers do not change.
+    """
+
+    def __init__(self, bboxes, cell_size=CELL_SIZE):
+        self.bboxes = [tuple(b) for b in bboxes]
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self.bands = defaultdict(list)  # y-only index for overlap_y
+        self.unbounded = []  # bboxes with infinite/NaN coordinates, always checked
+        for i, (x0, y0, x1, y1) in enumerate(self.bboxes):
+            if not all(math.isfinite(v) for v in (x0, y0, x1, y1)):
+                self.unbounded.append(i)
+                continue
+            ix0, ix1 = self._span(x0, x1, _PAD)
+            iy0, iy1 = self._span(y0, y1, _PAD)
+            for iy in range(iy0, iy1 + 1):
+                self.bands[iy].append(i)
+                for ix in range(ix0, ix1 + 1):
+                    self.cells[ix, iy].append(i)
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    def _span(self, lo, hi, margin):
+        return math.floor((lo - margin) / self.cell_size), math.floor((hi + margin) / self.cell_size)
+
+    def candidates(self, bbox, margin=0.0):
+        """Indices of bboxes that may be within margin of bbox, in insertion order."""
+        if not self.bboxes:
+            return []
+        x0, y0, x1, y1 = bbox[:4]
+        if not all(math.isfinite(v) for v in (x0, y0, x1, y1)):
+            return list(range(len(self.bboxes)))
+        ix0, ix1 = self._span(x0, x1, margin + _PAD)
+        iy0, iy1 = self._span(y0, y1, margin + _PAD)
+        found = set(self.unbounded)
+        for iy in range(iy0, iy1 + 1):
+            for ix in range(ix0, ix1 + 1):
+                found.update(self.cells.get((ix, iy), ()))
+        return sorted(found)
+
+    def candidates_y(self, bbox, margin=0.0):
+        if not self.bboxes:
+            return []
+        y0, y1 = bbox[1], bbox[3]
+        if not (math.isfinite(y0) and math.isfinite(y1)):
+            return list(range(len(self.bboxes)))
+        iy0, iy1 = self._span(y0, y1, margin + _PAD)
+        found = set(self.unbounded)
+        for iy in range(iy0, iy1 + 1):
+            found.update(self.bands.get(iy, ()))
+        return sorted(found)
+
+    def any_overlap(self, b1, tol=1.0):
+        """Same as any(is_overlap(b1, b2, tol) for b2 in bboxes)."""
+        for i in self.candidates(b1, tol):
+            b2 = self.bboxes[i]
+            if not (b1[2] < b2[0] - tol or b1[0] > b2[2] + tol or b1[3] < b2[1] - tol or b1[1] > b2[3] + tol):
+                return True
+        return False
+
+    def any_contains(self, b, tol=2):
+        """True if b lies inside some bbox grown by tol on every side."""
+        x0, y0, x1, y1 = b[:4]
+        for i in self.candidates(b, tol):
+            bx0, by0, bx1, by1 = self.bboxes[i]
+            if x0 >= bx0 - tol and y0 >= by0 - tol and x1 <= bx1 + tol and y1 <= by1 + tol:
+                return True
+        return False
+
+    def any_overlap_y(self, b1, tol=1.0):
+        """Vertical-only overlap: b1 shares a horizontal band with some bbox."""
+        for i in self.candidates_y(b1, tol):
+            b2 = self.bboxes[i]
+            if not (b1[3] < b2[1] - tol or b1[1] > b2[3] + tol):
+                return True
+        return False
@@ -0,0 +1,44 @@
+class StyleTable:
+    """Inline style declarations interned into generated CSS classes.
+
+    table(style) returns the class for a style string ('font-size:12px;color:#000000'),
+    creating it on first use. Output is streamed, so the rules cannot all go
+    into <head>: take_css() returns a <style> block with the classes created
+    since the previous call, to be written in front of the page that uses them.
+    """
+
+    def __init__(self, prefix='s'):
+        self.prefix = prefix
+        self.classes = {}
+        self.pending = []
+
+    def __call__(self, style):
+        name = self.classes.get(style)
+        if name is None:
+            name = f'{self.prefix}{len(self.classes)}'
+            self.classes[style] = name
+            self.pending.append((name, style))
+        return name
+
+    def take_css(self):
+        if not self.pending:
+            return ''
+        rules = ''.join(f'.{name}{{{style}}}' for name, style in self.pending)
+        self.pending = []
+        return f'<style>{rules}</style>'
+
+
+def coalesce(spans, key, adjacent=None):
+    """Group consecutive spans with equal key(span): [(key, [span, ...]), ...].
+
+    adjacent(prev, span) may veto a merge, e.g. when there is a visible gap
+    between two positioned spans.
+    """
+    groups = []
+    for span in spans:
+        k = key(span)
+        if groups and groups[-1][0] == k and (adjacent is None or adjacent(groups[-1][1][-1], span)):
+            groups[-1][1].append(span)
+        else:
+            groups.append((k, [span]))
+    return groups
@@ -0,0 +1,123 @@
+from collections import Counter, defaultdict
+
+from common.page_analysis import TEXT_FLAGS
+
+# A page is sent to table detection when it has at least MIN_RULES horizontal and
+# MIN_RULES vertical ruling segments, or (for detectors that find tables without
+# rulings) at least MIN_ALIGNED_ROWS text rows split into aligned columns
+MIN_RULES = 2
+MIN_ALIGNED_ROWS = 3
+# Ruling segments: at least RULE_MIN_LENGTH long, at most RULE_TOLERANCE off-axis (points)
+RULE_MIN_LENGTH = 3.0
+RULE_TOLERANCE = 1.0
+# Text lines are in one row / column when their centres / left edges are this close (points)
+ROW_TOLERANCE = 3.0
+COLUMN_TOLERANCE = 5.0
+# Images covering this share of the page may be scanned tables (rasterising detectors see them)
+IMAGE_MIN_AREA = 0.1
+
+
+def count_rules(drawings, min_length=RULE_MIN_LENGTH, tol=RULE_TOLERANCE, enough=None):
+    """(horizontal, vertical) ruling segments among page.get_cdrawings() paths.
+
+    Lines count once, rectangles (and quads, by their bbox) count for their
+    four edges, or as one line when thinner than tol. Curves never form tables.
+    Counting stops once both counts reach enough.
+    """
+    horizontal = vertical = 0
+    for path in drawings:
+        if enough is not None and horizontal >= enough and vertical >= enough:
+            break
+        for item in path['items']:
+            kind = item[0]
+            if kind == 'l':
+                (x0, y0), (x1, y1) = item[1], item[2]
+                dx, dy = abs(x1 - x0), abs(y1 - y0)
+                if dy <= tol and dx >= min_length:
+                    horizontal += 1
+                elif dx <= tol and dy >= min_length:
+                    vertical += 1
+                continue
+            if kind == 're':
+                x0, y0, x1, y1 = item[1]
+            elif kind == 'qu':
+                xs = [p[0] for p in item[1]]
+                ys = [p[1] for p in item[1]]
+                x0, y0, x1, y1 = min(xs), min(ys), max(xs), max(ys)
+            else:
+                continue
+            width, height = abs(x1 - x0), abs(y1 - y0)
+            if height <= tol:
+                horizontal += width >= min_length
+            elif width <= tol:
+                vertical += height >= min_length
+            else:
+                horizontal += 2 * (width >= min_length)
+                vertical += 2 * (height >= min_length)
+    return horizontal, vertical
+
+
+def aligned_rows(lines, row_tol=ROW_TOLERANCE, col_tol=COLUMN_TOLERANCE):
+    """Text rows split into two or more segments whose left edges recur in other such rows.
+
+    lines: (x0, y0, x1, y1, ...) tuples, e.g. PageAnalysis.lines. Prose has
+    one segment per row; a table without rulings has many rows whose cells
+    start at the same few x positions.
+    """
+    rows = defaultdict(set)
+    for x0, y0, x1, y1, *_ in lines:
+        rows[round((y0 + y1) / 2 / row_tol)].add(round(x0 / col_tol))
+    multi = [columns for columns in rows.values() if len(columns) >= 2]
+    counts = Counter(x for columns in multi for x in columns)
+    return sum(1 for columns in multi if sum(counts[x] >= 2 for x in columns) >= 2)
+
+
+class TablePrefilter:
+    """Cheap check run before table detection: could this page contain a table at all?
+
+    Looks at the page's vector drawings (page.get_cdrawings(), a fraction of
+    the cost of find_tables()) and, when text_columns is set, at how the text
+    lines line up in columns; with images set, a large image also makes the
+    page a candidate. Pages that are not candidates skip table detection.
+    PyMuPDF's find_tables() (the "lines" strategy) needs rulings, so a
+    rulings-only filter (the default) never drops a table it would find.
+    Camelot also finds tables from text alignment (stream) and in rendered
+    images (lattice): use text_columns=True, images=True for it.
+    """
+
+    def __init__(self, min_rules=MIN_RULES, min_aligned_rows=MIN_ALIGNED_ROWS, text_columns=False, images=False):
+        self.min_rules = min_rules
+        self.min_aligned_rows = min_aligned_rows
+        self.text_columns = text_columns
+        self.images = images
+        self.checked = 0
+        self.skipped = 0
+
+    def settings(self):
+        # what decides which pages are skipped, for output caches and manifests
+        return {'min_rules': self.min_rules, 'min_aligned_rows': self.min_aligned_rows,
+                'text_columns': self.text_columns, 'images': self.images}
+
+    def may_have_tables(self, page, lines=None):
+        """False when page can skip table detection; lines (x0, y0, x1, y1, ...) are read if not given."""
+        self.checked += 1
+        horizontal, vertical = count_rules(page.get_cdrawings(), enough=self.min_rules)
+        if horizontal >= self.min_rules and vertical >= self.min_rules:
+            return True
+        if self.images:
+            page_area = abs(page.rect)
+            for info in page.get_image_info():
+                x0, y0, x1, y1 = info['bbox']
+                if page_area and (x1 - x0) * (y1 - y0) >= IMAGE_MIN_AREA * page_area:
+                    return True
+        if self.text_columns:
+            if lines is None:
+                blocks = page.get_text('dict', flags=TEXT_FLAGS)['blocks']
+                lines = [l['bbox'] for b in blocks if b['type'] == 0 for l in b['lines']]
+            if aligned_rows(lines) >= self.min_aligned_rows:
+                return True
+        self.skipped += 1
+        return False
+
+    def stats(self):
+        return {'checked': self.checked, 'skipped': self.skipped}
@@ -0,0 +1,38 @@
+class HtmlWriter:
+    """Streaming HTML output.
+
+    Writes every chunk to a file path or to any writable text stream as soon
+    as it is produced and flushes it, so the converted document never has to
+    be held in memory as a whole.
+    """
+
+    def __init__(self, target, encoding='utf-8'):
+        if isinstance(target, str) or hasattr(target, '__fspath__'):
+            self.stream = open(target, 'w', encoding=encoding)
+            self.owns_stream = True
+        else:
+            self.stream = target
+            self.owns_stream = False
+
+    def write(self, text):
+        self.stream.write(text)
+        self.stream.flush()
+
+    def write_all(self, chunks, sep=''):
+        # Same result as write(sep.join(chunks)) without building the joined string
+        first = True
+        for chunk in chunks:
+            self.write(chunk if first else sep + chunk)
+            first = False
+
+    def close(self):
+        if self.owns_stream:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
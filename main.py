@@ -1,104 +1,327 @@
-
 import fitz  # PyMuPDF
 import camelot
 import os
 import re
-from collections import defaultdict, Counter
+from collections import defaultdict, deque, Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from common import instrument, lattice
+from common.cache import TableCache, file_digest
+from common.incremental import PageFingerprints, PageManifest, settings_digest, source_digests
+from common.layout import TextLine
+from common.page_analysis import PageAnalysis
+from common.page_cache import PageCache
+from common.spatial import BBoxIndex
+from common.table_prefilter import TablePrefilter
+from common.writer import HtmlWriter
 
 PDF_PATH = 'example.pdf'
 OUTPUT_HTML = 'output.html'
 
-# 1. Extract tables with Camelot (both flavors)
-def extract_tables(pdf_path):
-    tables = []
-    for flavor in ['lattice', 'stream']:
-        try:
-            t = camelot.read_pdf(pdf_path, pages='all', flavor=flavor, strip_text='\n')
-            tables.extend(t)
-        except Exception as e:
-            print(f'Camelot {flavor} error:', e)
-    # Deduplicate tables by bbox and page
+# Table extraction runs lattice first and stream only on pages where lattice found nothing.
+# Pages are split into chunks of TABLE_CHUNK_SIZE and spread over TABLE_WORKERS processes.
+TABLE_WORKERS = os.cpu_count() or 1
+TABLE_CHUNK_SIZE = 4
+# Table detection cache (common.cache.TableCache), enabled by PDF_TABLE_CACHE_DIR
+TABLE_CACHE = TableCache.from_env()
+CAMELOT_PARAMS = {'flavors': ['lattice', 'stream'], 'strip_text': '\n', 'version': camelot.__version__}
+# Ruled tables: 'camelot' (Camelot lattice, renders every page to find the rulings) or
+# 'native' (common.lattice, the rulings are read from the PDF's vector drawings, nothing is
+# rendered). Stream still runs on pages without ruled tables either way
+LATTICE_ENGINE = 'camelot'
+# Camelot only on pages with rulings, text aligned in columns or large images
+# (common.table_prefilter), None = every page
+TABLE_PREFILTER = TablePrefilter(text_columns=True, images=True)
+# Keep a page manifest next to the output and convert only pages changed since the last run
+INCREMENTAL = False
+# Header/footer lines are decided from the first HEADER_FOOTER_WINDOW pages; only these pages
+# are held back before output starts, later pages are written as soon as they are converted
+HEADER_FOOTER_WINDOW = 20
+# Fragments of pages converted on demand by convert_page_range (common.page_cache.PageCache)
+PAGE_CACHE = PageCache()
+
+def table_to_dict(table):
+    # Plain dict instead of camelot.core.Table: cheap to pickle back from a worker process
+    return {'page': table.page, 'bbox': tuple(table._bbox), 'html': table.df.to_html()}
+
+def read_tables(pdf_path, pages, flavor):
+    # None when Camelot failed: the pages have no known result (not "no tables")
+    try:
+        with instrument.stage(f'camelot_{flavor}'):
+            found = camelot.read_pdf(pdf_path, pages=','.join(str(p) for p in pages), flavor=flavor, strip_text='\n')
+    except Exception as e:
+        print(f'Camelot {flavor} error:', e)
+        return None
+    return [table_to_dict(t) for t in found]
+
+def lattice_table_html(table):
+    # <table> of a common.lattice table; a merged cell spans the grid positions its bbox covers
+    xs = sorted({x for x0, y0, x1, y1 in table['cell_bboxes'] for x in (x0, x1)})
+    ys = sorted({y for x0, y0, x1, y1 in table['cell_bboxes'] for y in (y0, y1)})
+    spans = {(ys.index(y0), xs.index(x0)): (ys.index(y1) - ys.index(y0), xs.index(x1) - xs.index(x0))
+             for x0, y0, x1, y1 in table['cell_bboxes']}
+    out = ['<table>\n']
+    for r, row in enumerate(table['rows']):
+        out.append('<tr>')
+        for c, text in enumerate(row):
+            if text is None:
+                continue  # covered by a merged cell
+            rowspan, colspan = spans.get((r, c), (1, 1))
+            attrs = (f' rowspan="{rowspan}"' if rowspan > 1 else '') + (f' colspan="{colspan}"' if colspan > 1 else '')
+            out.append(f'<td{attrs}>' + '<br>'.join(html_escape(t) for t in text.split('\n')) + '</td>')
+        out.append('</tr>\n')
+    out.append('</table>')
+    return ''.join(out)
+
+def read_native_tables(pdf_path, pages):
+    # (tables, failed pages): ruled tables from the vector drawings, bboxes in PyMuPDF page
+    # coordinates (origin top left); like read_tables, a page that raised has no known result
+    tables, failed = [], set()
+    with instrument.stage('native_lattice'), fitz.open(pdf_path) as doc:
+        for p in pages:
+            try:
+                found = lattice.find_lattice_tables(doc[p - 1])
+            except Exception as e:
+                print(f'Native lattice error on page {p}:', e)
+                failed.add(p)
+                continue
+            tables.extend({'page': p, 'bbox': t['bbox'], 'html': lattice_table_html(t), 'engine': 'native'}
+                          for t in found)
+    return tables, failed
+
+def table_params(lattice_engine):
+    # What decides the tables of a page, for the table cache and page manifests
+    if lattice_engine == 'native':
+        return {**CAMELOT_PARAMS, 'flavors': ['native', 'stream'], 'fitz': fitz.VersionBind,
+                'lattice': file_digest(lattice.__file__)}
+    return CAMELOT_PARAMS
+
+def read_page_tables(pdf_path, pages, lattice_engine=LATTICE_ENGINE):
+    """(tables, failed): lattice first, stream only for the pages where lattice found nothing.
+
+    failed holds the pages where a Camelot run (or the native lattice engine)
+    raised; their tables may be incomplete, so they must not be cached.
+    """
+    failed = set()
+    if lattice_engine == 'native':
+        tables, failed = read_native_tables(pdf_path, pages)
+    else:
+        tables = read_tables(pdf_path, pages, 'lattice')
+        if tables is None:
+            tables = []
+            failed.update(pages)
+    lattice_pages = {t['page'] for t in tables}
+    stream_pages = [p for p in pages if p not in lattice_pages]
+    if stream_pages:
+        stream_tables = read_tables(pdf_path, stream_pages, 'stream')
+        if stream_tables is None:
+            failed.update(stream_pages)
+        else:
+            tables.extend(stream_tables)
+    return tables, failed
+
+def _read_page_tables_task(args):
+    tables, failed = read_page_tables(*args)
+    # timings of a worker process travel back with its result
+    return tables, failed, instrument.drain() if instrument.enabled() else None
+
+def _dedupe_tables(tables):
+    # Deduplicate tables by bbox (tables of one page)
     seen = set()
     unique_tables = []
     for table in tables:
-        key = (table.page, tuple(table._bbox))
-        if key not in seen:
-            seen.add(key)
+        if table['bbox'] not in seen:
+            seen.add(table['bbox'])
             unique_tables.append(table)
     return unique_tables
 
-print('Extracting tables with Camelot...')
-tables = extract_tables(PDF_PATH)
+def iter_page_tables(pdf_path, workers=TABLE_WORKERS, chunk_size=TABLE_CHUNK_SIZE, cache=TABLE_CACHE, pages=None,
+                     prefilter=TABLE_PREFILTER, lattice_engine=LATTICE_ENGINE):
+    """Yield (page, tables) for every page in order (Camelot pages, 1-indexed).
+
+    Pages go to Camelot in chunks of chunk_size; with workers > 1 at most two
+    chunks per worker are in flight ahead of the consumer, so the first pages
+    are yielded while later ones are still being detected. Pages the prefilter
+    rules out are not given to Camelot. lattice_engine: see LATTICE_ENGINE.
+    """
+    with fitz.open(pdf_path) as doc:
+        if pages is None:
+            pages = list(range(1, len(doc) + 1))
+        digest = file_digest(pdf_path) if cache is not None else None
+        chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+        params = table_params(lattice_engine)
+
+        def lookup(chunk):
+            found, todo = {}, []
+            for p in chunk:
+                # the cache first: the prefilter may extract the page text again
+                tables = cache.get(digest, p - 1, 'camelot', params) if cache is not None else None
+                if tables is not None:
+                    found[p] = tables
+                elif prefilter is not None and not prefilter.may_have_tables(doc[p - 1]):
+                    found[p] = []
+                else:
+                    todo.append(p)
+            return found, todo
+
+        def results(chunk, found, todo, detected, failed):
+            by_page = defaultdict(list, found)
+            for t in detected:
+                by_page[t['page']].append(t)
+            if cache is not None:
+                for p in todo:
+                    if p not in failed:  # a failed run is retried next time, not remembered as "no tables"
+                        cache.put(digest, p - 1, 'camelot', params, by_page[p])
+            for p in chunk:
+                yield p, _dedupe_tables(by_page[p])
+
+        if workers <= 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                found, todo = lookup(chunk)
+                detected, failed = read_page_tables(pdf_path, todo, lattice_engine) if todo else ([], set())
+                yield from results(chunk, found, todo, detected, failed)
+            return
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=instrument.init_worker,
+                                 initargs=(instrument.worker_config(),)) as pool:
+            def submit(chunk):
+                found, todo = lookup(chunk)
+                future = pool.submit(_read_page_tables_task, (pdf_path, todo, lattice_engine)) if todo else None
+                return chunk, found, todo, future
+
+            chunks = iter(chunks)
+            pending = deque(submit(chunk) for chunk in islice(chunks, 2 * workers))
+            while pending:
+                chunk, found, todo, future = pending.popleft()
+                detected, failed = [], set()
+                if future is not None:
+                    detected, failed, timings = future.result()
+                    if timings:
+                        instrument.merge(timings)
+                for next_chunk in islice(chunks, 1):
+                    pending.append(submit(next_chunk))
+                yield from results(chunk, found, todo, detected, failed)
+
+# 1. Extract tables (lattice with Camelot or common.lattice, then Camelot stream for pages without lattice tables)
+@instrument.timed()
+def extract_tables(pdf_path, workers=TABLE_WORKERS, chunk_size=TABLE_CHUNK_SIZE, cache=TABLE_CACHE, pages=None,
+                   prefilter=TABLE_PREFILTER, lattice_engine=LATTICE_ENGINE):
+    return [t for _, tables in iter_page_tables(pdf_path, workers, chunk_size, cache, pages, prefilter, lattice_engine)
+            for t in tables]
 
 # Store table regions per page for later exclusion
 # Also store table HTML and Y position for interleaving
-per_page_tables = defaultdict(list)
-for table in tables:
-    page = table.page - 1  # Camelot pages are 1-indexed, PyMuPDF is 0-indexed
-    bbox = table._bbox  # (x1, y1, x2, y2)
-    y_top = bbox[1]
-    per_page_tables[page].append({'bbox': bbox, 'y': y_top, 'html': table.to_html()})
-
-def is_in_table(x0, y0, x1, y1, table_bboxes):
-    for bx0, by0, bx1, by1 in table_bboxes:
-        if (x0 >= bx0-2 and y0 >= by0-2 and x1 <= bx1+2 and y1 <= by1+2):
-            return True
-    return False
+def group_tables_by_page(tables):
+    per_page_tables = defaultdict(list)
+    for table in tables:
+        page = table['page'] - 1  # Camelot pages are 1-indexed, PyMuPDF is 0-indexed
+        bbox = table['bbox']  # (x1, y1, x2, y2)
+        y_top = bbox[1]
+        per_page_tables[page].append({'bbox': bbox, 'y': y_top, 'html': table['html'], 'engine': table.get('engine')})
+    return per_page_tables
+
+def is_in_table(x0, y0, x1, y1, table_index):
+    # table_index: common.spatial.BBoxIndex over the page's table bboxes
+    return table_index.any_contains((x0, y0, x1, y1), tol=2)
 
 def clean_text(text):
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
 
-def detect_headers_footers(all_lines, page_height, num_pages):
-    # Find lines that appear at the top/bottom of many pages (likely header/footer)
-    top_lines = []
-    bottom_lines = []
-    for lines in all_lines:
-        if not lines:
-            continue
-        # Top 5% and bottom 5% of page
-        tops = [l for l in lines if l['y0'] < 0.05 * page_height]
-        bots = [l for l in lines if l['y1'] > 0.95 * page_height]
-        top_lines.extend([l['text'] for l in tops])
-        bottom_lines.extend([l['text'] for l in bots])
-    top_counts = Counter(top_lines)
-    bot_counts = Counter(bottom_lines)
+def header_footer_candidates(lines, page_height):
+    # Texts of the lines in the top 5% and bottom 5% of the page
+    tops = [l.text for l in lines if l.y0 < 0.05 * page_height]
+    bots = [l.text for l in lines if l.y1 > 0.95 * page_height]
+    return tops, bots
+
+def count_headers_footers(candidates, num_pages):
+    # candidates: (tops, bots) per page
+    top_counts = Counter()
+    bot_counts = Counter()
+    for tops, bots in candidates:
+        top_counts.update(tops)
+        bot_counts.update(bots)
     # If a line appears on >60% of pages, treat as header/footer
     header = set([t for t, c in top_counts.items() if c > 0.6 * num_pages])
     footer = set([t for t, c in bot_counts.items() if c > 0.6 * num_pages])
     return header, footer
 
-def extract_lines(doc, per_page_tables):
-    all_page_lines = []
-    for page_num, page in enumerate(doc):
-        lines = []
-        table_bboxes = [t['bbox'] for t in per_page_tables.get(page_num, [])]
-        for l in page.get_text('lines'):
-            x0, y0, x1, y1, text, *_ = l
-            text = clean_text(text)
-            if not text:
-                continue
-            if is_in_table(x0, y0, x1, y1, table_bboxes):
-                continue
-            lines.append({'x0': x0, 'y0': y0, 'x1': x1, 'y1': y1, 'text': text})
-        all_page_lines.append(lines)
-    return all_page_lines
+@instrument.timed()
+def detect_headers_footers(candidates, window=HEADER_FOOTER_WINDOW):
+    # Lines that appear at the top/bottom of most of the first `window` pages (likely header/footer);
+    # candidates: (tops, bots) per page, from header_footer_candidates() with each page's own height
+    candidates = list(islice(candidates, window))
+    return count_headers_footers(candidates, len(candidates))
+
+class HeaderFooterDetector:
+    """Header/footer detection over a stream of pages.
+
+    Pages are fed one by one with add(); once `window` pages were seen (or
+    finish() is called for a shorter document) the header and footer sets
+    are fixed and ready is True. Only the candidate texts of the window are
+    kept, not the pages' lines.
+    """
+
+    def __init__(self, window=HEADER_FOOTER_WINDOW):
+        self.window = window
+        self.candidates = []
+        self.header = None
+        self.footer = None
 
+    @property
+    def ready(self):
+        return self.header is not None
+
+    def add(self, lines, page_height):
+        if self.ready:
+            return
+        self.candidates.append(header_footer_candidates(lines, page_height))
+        if len(self.candidates) >= self.window:
+            self.finish()
+
+    def finish(self):
+        if not self.ready:
+            self.header, self.footer = detect_headers_footers(self.candidates, self.window)
+            self.candidates = []
+        return self.header, self.footer
+
+@instrument.timed()
+def extract_page_lines(page, page_tables):
+    lines = []
+    table_index = BBoxIndex([t['bbox'] for t in page_tables])
+    # common.lattice puts a span into a table when its centre is inside, so lines are matched to
+    # native tables the same way (line boxes of CJK fonts overhang the rulings)
+    native_index = BBoxIndex([t['bbox'] for t in page_tables if t.get('engine') == 'native'])
+    analysis = PageAnalysis(page)
+    for l in analysis.lines:
+        x0, y0, x1, y1, text, *_ = l
+        text = clean_text(text)
+        if not text:
+            continue
+        if is_in_table(x0, y0, x1, y1, table_index):
+            continue
+        if native_index and native_index.any_contains(((x0 + x1) / 2, (y0 + y1) / 2) * 2, tol=0):
+            continue
+        lines.append(TextLine(x0, y0, x1, y1, text))
+    analysis.release()
+    return lines
+
+@instrument.timed()
 def group_paragraphs(lines, y_gap=10):
     # Group lines into paragraphs by vertical gap and indentation
     if not lines:
         return []
-    lines = sorted(lines, key=lambda l: (l['y0'], l['x0']))
+    lines = sorted(lines, key=lambda l: (l.y0, l.x0))
     paragraphs = []
     para = []
     last_y = None
     for l in lines:
-        if last_y is not None and abs(l['y0'] - last_y) > y_gap:
+        if last_y is not None and abs(l.y0 - last_y) > y_gap:
             if para:
                 paragraphs.append(para)
                 para = []
         para.append(l)
-        last_y = l['y1']
+        last_y = l.y1
     if para:
         paragraphs.append(para)
     return paragraphs
@@ -111,36 +334,189 @@ def html_escape(text):
             .replace('"', '&quot;')
     )
 
-print('Extracting non-table text with PyMuPDF...')
-doc = fitz.open(PDF_PATH)
-all_page_lines = extract_lines(doc, per_page_tables)
-header, footer = detect_headers_footers(all_page_lines, doc[0].rect.height, len(doc))
-
-
-# 3. Merge tables and text into HTML, preserving order by Y
-print('Writing output HTML...')
-with open(OUTPUT_HTML, 'w', encoding='utf-8') as f:
-    f.write('<!DOCTYPE html>\n<html lang="zh">\n<head>\n<meta charset="utf-8">\n<title>PDF to HTML</title>\n<style>table, th, td { border: 1px solid #888; border-collapse: collapse; } th, td { padding: 4px; } body { font-family: sans-serif; } p { margin: 0.5em 0; }</style>\n</head>\n<body>\n')
-    for page_num, page in enumerate(doc):
-        f.write(f'<div class="page" id="page-{page_num+1}">\n')
-        # Prepare all content blocks (paragraphs and tables) with their Y position
-        content_blocks = []
-        # Paragraphs
-        lines = [l for l in all_page_lines[page_num] if l['text'] not in header and l['text'] not in footer]
-        for para in group_paragraphs(lines):
-            y = para[0]['y0']
-            para_text = ''.join([html_escape(l['text']) for l in para])
-            content_blocks.append({'y': y, 'type': 'p', 'html': f'<p>{para_text}</p>'})
-        # Tables
-        for t in per_page_tables.get(page_num, []):
-            table_html = re.sub(r'<(/?)(html|body)[^>]*>', '', t['html'])
-            content_blocks.append({'y': t['y'], 'type': 'table', 'html': table_html})
-        # Sort by Y position
-        content_blocks.sort(key=lambda b: b['y'])
-        for block in content_blocks:
-            f.write(block['html'] + '\n')
-        f.write('</div>\n')
-    f.write('</body>\n</html>\n')
-
-
-print(f'Done! Output written to {OUTPUT_HTML}')
+HTML_HEAD = '<!DOCTYPE html>\n<html lang="zh">\n<head>\n<meta charset="utf-8">\n<title>PDF to HTML</title>\n<style>table, th, td { border: 1px solid #888; border-collapse: collapse; } th, td { padding: 4px; } body { font-family: sans-serif; } p { margin: 0.5em 0; }</style>\n</head>\n<body>\n'
+HTML_TAIL = '</body>\n</html>\n'
+
+@instrument.timed()
+def render_page(page_num, lines, page_tables, header, footer):
+    out = [f'<div class="page" id="page-{page_num+1}">\n']
+    # Prepare all content blocks (paragraphs and tables) with their Y position
+    content_blocks = []
+    # Paragraphs
+    lines = [l for l in lines if l.text not in header and l.text not in footer]
+    for para in group_paragraphs(lines):
+        y = para[0].y0
+        para_text = ''.join([html_escape(l.text) for l in para])
+        content_blocks.append({'y': y, 'type': 'p', 'html': f'<p>{para_text}</p>'})
+    # Tables
+    for t in page_tables:
+        table_html = re.sub(r'<(/?)(html|body)[^>]*>', '', t['html'])
+        content_blocks.append({'y': t['y'], 'type': 'table', 'html': table_html})
+    # Sort by Y position
+    content_blocks.sort(key=lambda b: b['y'])
+    for block in content_blocks:
+        out.append(block['html'] + '\n')
+    out.append('</div>\n')
+    return ''.join(out)
+
+def iter_html(pdf_path):
+    """Yield the output document chunk by chunk, one chunk per page.
+
+    Camelot, text extraction and rendering run page by page in one pass. The
+    pages of the header/footer window wait (with their lines) until the
+    header/footer sets are decided; every later page is yielded as soon as
+    its tables are detected, so memory does not grow with the page count.
+    """
+    print('Converting pages (tables with Camelot, text with PyMuPDF)...')
+    doc = fitz.open(pdf_path)
+    detector = HeaderFooterDetector()
+    held = deque()
+    yield HTML_HEAD
+    # module settings are passed explicitly so that changes after import (batch.py, service.py) apply
+    page_tables_iter = iter_page_tables(pdf_path, TABLE_WORKERS, TABLE_CHUNK_SIZE, TABLE_CACHE,
+                                        prefilter=TABLE_PREFILTER, lattice_engine=LATTICE_ENGINE)
+    for page_number, tables in page_tables_iter:
+        page_num = page_number - 1  # Camelot pages are 1-indexed, PyMuPDF is 0-indexed
+        instrument.set_page(page_num)
+        page = doc[page_num]
+        page_tables = group_tables_by_page(tables).get(page_num, [])
+        lines = extract_page_lines(page, page_tables)
+        detector.add(lines, page.rect.height)
+        held.append((page_num, lines, page_tables))
+        if detector.ready:
+            # 3. Merge tables and text into HTML, preserving order by Y
+            while held:
+                yield render_page(*held.popleft(), detector.header, detector.footer)
+    header, footer = detector.finish()
+    while held:
+        yield render_page(*held.popleft(), header, footer)
+    yield HTML_TAIL
+
+def iter_incremental_html(pdf_path, manifest):
+    """iter_html() that converts only the pages changed since manifest was written.
+
+    Per page the manifest keeps the fragment, the Camelot tables and the header/footer
+    candidates. Camelot runs on changed pages only; an unchanged page is re-rendered
+    from its stored tables when the document-wide header/footer sets have changed,
+    otherwise its fragment is reused as is.
+    """
+    doc = fitz.open(pdf_path)
+    fingerprints = PageFingerprints(doc)
+    fingerprints = [fingerprints.page(i) for i in range(len(doc))]
+    entries = [manifest.lookup(i, fp) for i, fp in enumerate(fingerprints)]
+    changed = [i for i, entry in enumerate(entries) if entry is None]
+
+    print(f'Extracting tables with Camelot ({len(changed)} changed pages)...')
+    per_page_tables = group_tables_by_page(extract_tables(
+        pdf_path, TABLE_WORKERS, TABLE_CHUNK_SIZE, TABLE_CACHE, [i + 1 for i in changed], TABLE_PREFILTER,
+        LATTICE_ENGINE)) if changed else {}
+    page_tables, candidates = [], []
+    for i, entry in enumerate(entries):
+        if entry is None:
+            tables = per_page_tables.get(i, [])
+            candidates.append(header_footer_candidates(extract_page_lines(doc[i], tables), doc[i].rect.height))
+        else:
+            tables = entry['tables']
+            candidates.append((entry['tops'], entry['bots']))
+        page_tables.append(tables)
+    header, footer = detect_headers_footers(candidates)
+    header_footer = settings_digest(header=sorted(header), footer=sorted(footer))
+
+    print('Writing output HTML...')
+    yield HTML_HEAD
+    for i, entry in enumerate(entries):
+        if entry is not None and entry['header_footer'] == header_footer:
+            manifest.reuse(i, entry)
+            yield manifest.fragment(entry)
+            continue
+        instrument.set_page(i)
+        fragment = render_page(i, extract_page_lines(doc[i], page_tables[i]), page_tables[i], header, footer)
+        tops, bots = candidates[i]
+        manifest.record(i, fingerprints[i], fragment, tables=page_tables[i], tops=tops, bots=bots,
+                        header_footer=header_footer)
+        yield fragment
+    manifest.save()
+    yield HTML_TAIL
+
+def text_headers_footers(doc):
+    # Header/footer sets from the text layer of the window pages alone (no Camelot),
+    # so that a page range can be rendered without detecting tables on those pages
+    pages = (doc[i] for i in range(min(HEADER_FOOTER_WINDOW, len(doc))))
+    return detect_headers_footers(header_footer_candidates(extract_page_lines(page, []), page.rect.height)
+                                  for page in pages)
+
+def convert_page_range(pdf_path, pages, cache=PAGE_CACHE):
+    """HTML fragments of the page indices in pages (0-based), converted on demand.
+
+    Camelot and line extraction run on these pages only. Header/footer sets
+    are counted once per document over the text of the window pages without
+    table exclusion, so in the rare case of a table row repeated at the top or
+    bottom of most pages the result can differ from iter_html(). Fragments
+    and header/footer sets are kept in cache; cache=None converts every time.
+    """
+    pages = list(pages)
+    key = (file_digest(pdf_path), 'main', page_settings(pdf_path)) if cache is not None else None
+
+    def convert_missing(missing):
+        per_page_tables = group_tables_by_page(extract_tables(
+            pdf_path, TABLE_WORKERS, TABLE_CHUNK_SIZE, TABLE_CACHE, [i + 1 for i in missing], TABLE_PREFILTER,
+            LATTICE_ENGINE))
+        with fitz.open(pdf_path) as doc:
+            if cache is None:
+                header, footer = text_headers_footers(doc)
+            else:
+                header, footer = cache.document(key, lambda: text_headers_footers(doc))
+            fragments = []
+            for i in missing:
+                instrument.set_page(i)
+                page_tables = per_page_tables.get(i, [])
+                fragments.append(render_page(i, extract_page_lines(doc[i], page_tables), page_tables, header, footer))
+        return fragments
+
+    if cache is None:
+        return convert_missing(pages)
+    return cache.get_pages(key, pages, convert_missing)
+
+# Modules whose code shapes a page fragment (page_settings)
+COMMON_MODULES = ('common.cache', 'common.lattice', 'common.layout', 'common.page_analysis', 'common.spatial',
+                  'common.table_prefilter')
+
+def page_settings(pdf_path):
+    # Everything besides the page itself that changes a page fragment, this file and the common modules included
+    return settings_digest(converter=file_digest(__file__), common=source_digests(*COMMON_MODULES),
+                           camelot=table_params(LATTICE_ENGINE), fitz=fitz.VersionBind,
+                           header_footer_window=HEADER_FOOTER_WINDOW,
+                           table_prefilter=TABLE_PREFILTER.settings() if TABLE_PREFILTER is not None else None)
+
+def convert(pdf_path, output, incremental=INCREMENTAL):
+    """Convert pdf_path and stream the HTML into output (a path or a writable text stream).
+
+    incremental: keep a page manifest next to output (a path) and convert only changed pages.
+    Returns the manifest, if any.
+    """
+    if incremental:
+        manifest = PageManifest(output, page_settings(pdf_path))
+        chunks = iter_incremental_html(pdf_path, manifest)
+    else:
+        manifest = None
+        chunks = iter_html(pdf_path)
+    with HtmlWriter(output) as out:
+        out.write_all(chunks)
+    return manifest
+
+def main():
+    # Timing report / trace / cProfile are switched on by PDF_INSTRUMENT_* variables
+    outputs = instrument.configure_from_env()
+    manifest = convert(PDF_PATH, OUTPUT_HTML)
+    print(f'Done! Output written to {OUTPUT_HTML}')
+    if manifest:
+        print(f'Pages: {manifest.stats()}')
+    if TABLE_CACHE:
+        print(f'Table cache: {TABLE_CACHE.stats()}')
+    if TABLE_PREFILTER is not None:
+        print(f'Table prefilter: {TABLE_PREFILTER.stats()}')
+    if instrument.enabled():
+        instrument.finish(outputs['report'], outputs['trace'], outputs['cprofile'])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,397 @@
+"""HTTP conversion service: POST a PDF, get the HTML streamed back page by page.
+
+    python service.py --port 8080 --workers 4
+    curl --data-binary @example.pdf -H 'Content-Type: application/pdf' \\
+         'http://localhost:8080/convert?engine=var11&name=example.pdf'
+
+Endpoints:
+    POST /convert   body = PDF bytes; query: engine (var11 | main), name (shown in
+                    var11 page marks), pages (e.g. 120-125,130: only these pages),
+                    timeout (seconds). Response is chunked text/html, one chunk
+                    per page as soon as it is converted.
+    GET  /healthz   200 when at least one worker is alive, 503 otherwise
+    GET  /metrics   counters in Prometheus text format
+
+Conversions run in WORKERS pre-started processes that import both engines
+(PyMuPDF, camelot, ...) once at start. At most MAX_QUEUE requests wait for a
+free worker: beyond that the service answers 429, and a request that waited
+QUEUE_TIMEOUT seconds without getting a worker gets 503. A conversion that
+exceeds its timeout is stopped by killing its worker, which is replaced.
+A malformed request gets 400, an upload PyMuPDF cannot open 422 and a
+conversion that fails on a readable PDF 500.
+Page ranges are served from each worker's in-memory page cache
+(common.page_cache) when the same document was seen before.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import fitz  # PyMuPDF
+
+from common.page_cache import parse_pages
+
+WORKERS = os.cpu_count() or 1
+MAX_QUEUE = 16
+QUEUE_TIMEOUT = 30
+REQUEST_TIMEOUT = 300
+MAX_TIMEOUT = 3600
+MAX_UPLOAD = 256 * 1024 * 1024
+ENGINES = ('var11', 'main')
+
+
+def _engine_chunks(engine, pdf_path, pdf_name, page_spec=None):
+    # (chunks, separator) with the same contract as the engines' iter_html();
+    # with page_spec only those pages, through the engine's page cache
+    if engine == 'var11':
+        from var11 import main as var11_main
+        if page_spec is None:
+            return var11_main.iter_html(pdf_path, pdf_name, workers=1), '\n'
+        head, tail, sep = '\n'.join(var11_main.HTML_HEAD), var11_main.HTML_TAIL, '\n'
+        convert_range = lambda pages: var11_main.convert_page_range(pdf_path, pages, pdf_name)
+    else:
+        import main
+        if page_spec is None:
+            return main.iter_html(pdf_path), ''
+        head, tail, sep = main.HTML_HEAD, main.HTML_TAIL, ''
+        convert_range = lambda pages: main.convert_page_range(pdf_path, pages)
+    with fitz.open(pdf_path) as doc:
+        pages = parse_pages(page_spec, len(doc))
+    return [head, *convert_range(pages), tail], sep
+
+
+def _worker_main(conn):
+    # Warm up: every import an engine needs is paid once per process, not per request
+    import main
+    import var11.main  # noqa: F401
+    main.TABLE_WORKERS = 1  # one conversion per worker process, no nested pools
+    conn.send(('ready', os.getpid()))
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+        engine, pdf_name, page_spec, data = job
+        fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            try:
+                fitz.open(pdf_path).close()  # reject broken uploads before the first chunk
+            except Exception as e:
+                conn.send(('rejected', f'not a readable PDF: {type(e).__name__}: {e}\n'))
+                continue
+            chunks, sep = _engine_chunks(engine, pdf_path, pdf_name, page_spec)
+            for i, chunk in enumerate(chunks):
+                conn.send(('chunk', chunk if i == 0 else sep + chunk))
+            conn.send(('end', None))
+        except Exception as e:
+            traceback.print_exc()
+            conn.send(('error', f'{type(e).__name__}: {e}\n'))
+        finally:
+            os.remove(pdf_path)
+
+
+class Worker:
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.ready = False
+
+    def wait_ready(self, timeout=None):
+        if not self.ready and self.conn.poll(timeout):
+            self.ready = self.conn.recv()[0] == 'ready'
+        return self.ready
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """Pre-started worker processes handed out one request at a time."""
+
+    def __init__(self, size, metrics):
+        self.context = multiprocessing.get_context('spawn')
+        self.metrics = metrics
+        self.workers = [Worker(self.context) for _ in range(size)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def wait_ready(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for worker in self.workers:
+            worker.wait_ready(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    def acquire(self, timeout):
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if not worker.process.is_alive():
+            worker = self.replace(worker)
+        return worker
+
+    def release(self, worker):
+        self.idle.put(worker)
+
+    def replace(self, worker):
+        # the worker may be stuck in a conversion: kill it and start a fresh one
+        worker.kill()
+        fresh = Worker(self.context)
+        self.workers[self.workers.index(worker)] = fresh
+        self.metrics.inc('worker_restarts_total')
+        return fresh
+
+    def alive(self):
+        return sum(w.process.is_alive() for w in self.workers)
+
+    def close(self):
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.kill()
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {'requests_waiting': 0, 'requests_in_progress': 0}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add(self, gauge, value):
+        with self.lock:
+            self.gauges[gauge] += value
+            return self.gauges[gauge]
+
+    def render(self, extra):
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                label_text = ','.join(f'{k}="{v}"' for k, v in labels)
+                lines.append(f'pdf_to_html_{name}{{{label_text}}} {value}' if labels else f'pdf_to_html_{name} {value}')
+            for name, value in {**self.gauges, **extra}.items():
+                lines.append(f'pdf_to_html_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'pdf_to_html'
+
+    @property
+    def pool(self):
+        return self.server.pool
+
+    @property
+    def metrics(self):
+        return self.server.metrics
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/healthz':
+            alive = self.pool.alive()
+            body = {'status': 'ok' if alive else 'down', 'workers': alive, 'idle': self.pool.idle.qsize(),
+                    'waiting': self.metrics.gauges['requests_waiting']}
+            self._reply(200 if alive else 503, json.dumps(body), 'application/json')
+        elif path == '/metrics':
+            extra = {'workers_alive': self.pool.alive(), 'workers_idle': self.pool.idle.qsize()}
+            self._reply(200, self.metrics.render(extra), 'text/plain; version=0.0.4')
+        else:
+            self._reply(404, 'not found\n')
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/convert':
+            self._reply(404, 'not found\n')
+            return
+        query = parse_qs(url.query)
+        engine = query.get('engine', ['var11'])[0]
+        pdf_name = query.get('name', ['upload.pdf'])[0]
+        page_spec = query.get('pages', [None])[0]
+        try:
+            timeout = float(query.get('timeout', [REQUEST_TIMEOUT])[0])
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            self._finish(400, 'Content-Length and a numeric timeout are required\n')
+            return
+        if not (math.isfinite(timeout) and timeout > 0):
+            self._finish(400, 'timeout must be a positive number of seconds\n')
+            return
+        timeout = min(timeout, MAX_TIMEOUT)
+        if length < 0:
+            self._finish(400, 'Content-Length must not be negative\n')
+            return
+        if page_spec is not None:
+            try:
+                parse_pages(page_spec, 0)  # syntax only, the page count is known to the worker
+            except ValueError:
+                self._finish(400, f'bad page ranges {page_spec!r}\n')
+                return
+        if engine not in ENGINES:
+            self._finish(400, f'unknown engine {engine!r}, expected one of {", ".join(ENGINES)}\n')
+            return
+        if length > MAX_UPLOAD:
+            self._finish(413, f'upload larger than {MAX_UPLOAD} bytes\n')
+            return
+        # read the upload before taking a worker so slow clients do not hold one
+        data = self.rfile.read(length)
+
+        if self.metrics.add('requests_waiting', 1) > MAX_QUEUE:
+            self.metrics.add('requests_waiting', -1)
+            self._finish(429, 'too many requests waiting\n', {'Retry-After': '1'})
+            return
+        try:
+            worker = self.pool.acquire(QUEUE_TIMEOUT)
+        finally:
+            self.metrics.add('requests_waiting', -1)
+        if worker is None:
+            self._finish(503, 'no conversion worker available\n', {'Retry-After': str(QUEUE_TIMEOUT)})
+            return
+
+        self.metrics.add('requests_in_progress', 1)
+        start = time.perf_counter()
+        try:
+            worker = self._convert(worker, engine, pdf_name, page_spec, data, timeout)
+        except BaseException:
+            # the job may still be in the worker's pipe, its replies would go to the next request
+            worker = self.pool.replace(worker)
+            raise
+        finally:
+            self.metrics.add('requests_in_progress', -1)
+            self.metrics.inc('conversion_seconds_sum', time.perf_counter() - start, engine=engine)
+            self.pool.release(worker)
+
+    def _convert(self, worker, engine, pdf_name, page_spec, data, timeout):
+        # Streams the worker's chunks to the client; returns the worker to put back
+        # into the pool (a fresh one if this one had to be killed)
+        deadline = time.monotonic() + timeout
+        worker.conn.send((engine, pdf_name, page_spec, data))
+        streaming = False
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not worker.conn.poll(remaining):
+                worker = self.pool.replace(worker)
+                if streaming:
+                    self.close_connection = True  # truncated body: no terminating chunk
+                    self._count(504, engine)
+                else:
+                    self._finish(504, f'conversion exceeded {timeout:g}s\n', engine=engine)
+                return worker
+            try:
+                kind, payload = worker.conn.recv()
+            except EOFError:  # worker process died
+                worker = self.pool.replace(worker)
+                if streaming:
+                    self.close_connection = True
+                    self._count(500, engine)
+                else:
+                    self._finish(500, 'conversion worker died\n', engine=engine)
+                return worker
+            try:
+                if kind in ('rejected', 'error'):
+                    # rejected: PyMuPDF could not open the upload, before any chunk was sent
+                    status = 422 if kind == 'rejected' else 500
+                    if streaming:
+                        self.close_connection = True
+                        self._count(status, engine)
+                    else:
+                        self._finish(status, payload, engine=engine)
+                    return worker
+                if not streaming:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    streaming = True
+                if kind == 'end':
+                    self.wfile.write(b'0\r\n\r\n')
+                    self._count(200, engine)
+                    return worker
+                chunk = payload.encode('utf-8')
+                self.wfile.write(f'{len(chunk):X}\r\n'.encode() + chunk + b'\r\n')
+                self.wfile.flush()
+                self.metrics.inc('chunks_streamed_total', engine=engine)
+            except (BrokenPipeError, ConnectionResetError):
+                # client went away: the worker is still converting, replace it
+                self.close_connection = True
+                self._count(499, engine)
+                return self.pool.replace(worker)
+
+    def _count(self, status, engine=None):
+        labels = {'status': status}
+        if engine:
+            labels['engine'] = engine
+        self.metrics.inc('requests_total', **labels)
+
+    def _finish(self, status, text, headers=None, engine=None):
+        self._count(status, engine)
+        self._reply(status, text, headers=headers)
+
+    def _reply(self, status, text, content_type='text/plain; charset=utf-8', headers=None):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_server(host='127.0.0.1', port=8080, workers=WORKERS):
+    metrics = Metrics()
+    server = ThreadingHTTPServer((host, port), ConversionHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    server.pool = WorkerPool(workers, metrics)
+    return server
+
+
+def main():
+    global MAX_QUEUE, QUEUE_TIMEOUT, REQUEST_TIMEOUT
+    parser = argparse.ArgumentParser(description='PDF to HTML conversion service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--max-queue', type=int, default=MAX_QUEUE, help='requests allowed to wait for a worker')
+    parser.add_argument('--queue-timeout', type=float, default=QUEUE_TIMEOUT)
+    parser.add_argument('--timeout', type=float, default=REQUEST_TIMEOUT, help='default conversion timeout')
+    args = parser.parse_args()
+    MAX_QUEUE, QUEUE_TIMEOUT, REQUEST_TIMEOUT = args.max_queue, args.queue_timeout, args.timeout
+    server = make_server(args.host, args.port, args.workers)
+    print(f'Starting {args.workers} workers...')
+    server.pool.wait_ready()
+    print(f'Listening on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+import fitz
+
+from common.lattice import find_lattice_tables
+
+
+def _tables(build):
+    doc = fitz.open()
+    page = doc.new_page()
+    build(page)
+    return find_lattice_tables(page)
+
+
+def test_crossing_rules_without_text_are_not_a_table():
+    def build(page):
+        for y in (300, 400):
+            page.draw_line((150, y), (450, y))
+        for x in (250, 350):
+            page.draw_line((x, 200), (x, 500))
+        page.insert_text((150, 550), 'Figure 1: labels outside the grid')
+    assert _tables(build) == []
+
+
+def test_merged_header_cell():
+    def build(page):
+        for y in (100, 130, 160, 190):
+            page.draw_line((100, y), (400, y))
+        for x in (100, 400):
+            page.draw_line((x, 100), (x, 190))
+        page.draw_line((250, 130), (250, 190))
+        page.insert_text((110, 120), 'Head')
+        for r, y in enumerate((150, 180)):
+            page.insert_text((110, y), f'a{r}')
+            page.insert_text((260, y), f'b{r}')
+    [table] = _tables(build)
+    assert table['bbox'] == (100, 100, 400, 190)
+    assert table['rows'] == [['Head', None], ['a0', 'b0'], ['a1', 'b1']]
+    assert table['cell_bboxes'][0] == (100, 100, 400, 130)
+    assert len(table['cell_bboxes']) == 5
+
+
+def test_open_sided_table_gets_its_outer_columns():
+    def build(page):
+        for y in (100, 130, 160, 190):
+            page.draw_line((100, y), (400, y))
+        for x in (200, 300):
+            page.draw_line((x, 100), (x, 190))
+        for r, y in enumerate((120, 150, 180)):
+            for c, x in enumerate((110, 210, 310)):
+                page.insert_text((x, y), f'{r}{c}')
+    [table] = _tables(build)
+    assert table['bbox'] == (100, 100, 400, 190)
+    assert table['rows'] == [['00', '01', '02'], ['10', '11', '12'], ['20', '21', '22']]
@@ -0,0 +1,55 @@
+import fitz
+
+from common.ocr_router import OcrRouter
+from common.page_analysis import PageAnalysis
+
+
+def _image(page, rect):
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 40, 40), False)
+    pix.clear_with(200)
+    page.insert_image(rect, pixmap=pix)
+
+
+def _route(build):
+    doc = fitz.open()
+    page = doc.new_page()
+    build(page)
+    return OcrRouter().route(PageAnalysis(page))
+
+
+def test_blank_page_is_not_ocred():
+    assert _route(lambda page: None) == []
+
+
+def test_vector_only_page_is_not_ocred():
+    def build(page):
+        for y in (100, 130, 160):
+            page.draw_line((60, y), (300, y))
+        for x in (60, 180, 300):
+            page.draw_line((x, 100), (x, 160))
+        page.draw_circle((300, 500), 40)
+    assert _route(build) == []
+
+
+def test_scanned_page_is_ocred_whole():
+    assert _route(lambda page: _image(page, page.rect)) == [fitz.Rect(0, 0, 595, 842)]
+
+
+def test_page_scanned_in_strips_is_ocred_whole():
+    def build(page):
+        height = page.rect.height / 4
+        for i in range(4):
+            _image(page, fitz.Rect(0, i * height, page.rect.width, (i + 1) * height))
+    assert _route(build) == [fitz.Rect(0, 0, 595, 842)]
+
+
+def test_textless_page_with_one_picture_ocrs_the_picture():
+    rect = fitz.Rect(100, 100, 300, 250)
+    assert _route(lambda page: _image(page, rect)) == [rect]
+
+
+def test_blank_page_skips_ocr_without_loading_var8():
+    doc = fitz.open()
+    router = OcrRouter()
+    assert router.ocr_page(PageAnalysis(doc.new_page())) == ([], [])
+    assert router.stats() == {'pages': 0, 'regions': 0, 'skipped': 1}
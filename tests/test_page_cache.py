@@ -0,0 +1,46 @@
+import pytest
+
+from common.page_cache import PageCache, parse_pages
+
+
+@pytest.mark.parametrize('spec, page_count, pages', [
+    ('1-3,7', 10, [0, 1, 2, 6]),
+    ('1-', 3, [0, 1, 2]),
+    ('2-', 3, [1, 2]),
+    ('-3', 10, [0, 1, 2]),
+    ('5-', 3, []),
+    ('5-7', 3, []),
+    ('2-5', 3, [1, 2]),
+    ('2,2,1-2', 10, [0, 1]),
+    (' 3 , ,1', 10, [0, 2]),
+    ('1-', 0, []),
+])
+def test_parse_pages(spec, page_count, pages):
+    assert parse_pages(spec, page_count) == pages
+
+
+@pytest.mark.parametrize('spec', ['0', '3-1', '0-', 'a', '1-b'])
+def test_parse_pages_rejects(spec):
+    with pytest.raises(ValueError):
+        parse_pages(spec, 10)
+
+
+def _convert(calls):
+    def convert(missing):
+        calls.append(list(missing))
+        return [f'page {i}' for i in missing]
+    return convert
+
+
+@pytest.mark.parametrize('first, second, hits, misses, converted', [
+    ([1, 1, 2], [2, 2, 3, 3], 1, 3, [[1, 2], [3]]),
+    ([0, 1], [1, 0, 1], 2, 2, [[0, 1]]),
+    ([4, 4, 4], [4], 1, 1, [[4]]),
+])
+def test_get_pages_counts_distinct_pages(first, second, hits, misses, converted):
+    cache = PageCache()
+    calls = []
+    assert cache.get_pages(('doc',), first, _convert(calls)) == [f'page {i}' for i in first]
+    assert cache.get_pages(('doc',), second, _convert(calls)) == [f'page {i}' for i in second]
+    assert (cache.hits, cache.misses) == (hits, misses)
+    assert calls == converted
@@ -1,12 +1,26 @@
 import fitz
 from collections import defaultdict
 
-
-def pdf_to_html(pdf_path, html_path):
-    doc = fitz.open(pdf_path)
-    html = []
-
-    html.append('''<!DOCTYPE html>
+from common.cache import TableCache
+from common.images import ImageStore
+from common.page_analysis import iter_page_analyses
+from common.styles import StyleTable, coalesce
+from common.table_prefilter import TablePrefilter
+from common.writer import HtmlWriter
+
+# кэш распознанных таблиц, включается переменной окружения PDF_TABLE_CACHE_DIR
+TABLE_CACHE = TableCache.from_env()
+# таблицы ищутся только на страницах с линиями разметки (common.table_prefilter);
+# None - find_tables() на каждой странице
+TABLE_PREFILTER = TablePrefilter()
+# стили спанов выносятся в CSS-классы, соседние спаны с одним стилем склеиваются;
+# False - как раньше, style="..." на каждом спане
+INTERN_STYLES = True
+# картинки пишутся файлами в <имя html>_images/ и подключаются <img loading="lazy">
+EXTRACT_IMAGES = True
+
+
+HTML_HEAD = '''<!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
@@ -44,99 +58,136 @@ def pdf_to_html(pdf_path, html_path):
         }
     </style>
 </head>
-<body>''')
+<body>'''
+HTML_TAIL = '</body></html>'
 
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        blocks = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_PRESERVE_IMAGES)["blocks"]
 
-        html.append(f'<div class="page" data-page="{page_num + 1}">')
+def span_style(span):
+    style = {
+        "font-family": span["font"],
+        "font-size": f"{span['size']}px",
+        "font-weight": "bold" if span["flags"] & 2 ** 0 else "normal",
+        "font-style": "italic" if span["flags"] & 2 ** 1 else "normal"
+    }
+    return "; ".join(f"{k}: {v}" for k, v in style.items())
 
-        # Собираем все элементы страницы
-        elements = []
-
-        for block in blocks:
-            if block["type"] == 0:  # Text block
-                text_lines = []
-                for line in block["lines"]:
-                    line_text = []
-                    for span in line["spans"]:
-                        style = {
-                            "font-family": span["font"],
-                            "font-size": f"{span['size']}px",
-                            "font-weight": "bold" if span["flags"] & 2 ** 0 else "normal",
-                            "font-style": "italic" if span["flags"] & 2 ** 1 else "normal"
-                        }
-                        style_str = "; ".join(f"{k}: {v}" for k, v in style.items())
-                        line_text.append(f'<span style="{style_str}">{span["text"]}</span>')
-                    text_lines.append("".join(line_text))
-                elements.append({
-                    "type": "text",
-                    "bbox": block["bbox"],
-                    "content": "<br>".join(text_lines),
-                    "indent": block["bbox"][0] > 50  # Простое определение отступа
-                })
-
-            elif block["type"] == 1:  # Image block
-                pass  # Пропускаем изображения для этого примера
-
-        # Обрабатываем таблицы
-        tables = page.find_tables()
-        for table in tables:
-            cells = table.extract()
-            table_html = ['<table>']
-            for row in cells:
-                table_html.append('<tr>')
-                for cell in row:
-                    table_html.append(f'<td>{cell}</td>')
-                table_html.append('</tr>')
-            table_html.append('</table>')
-
-            elements.append({
-                "type": "table",
-                "bbox": table.bbox,
-                "content": "".join(table_html)
-            })
 
-        # Сортируем элементы по вертикальной позиции
-        elements.sort(key=lambda x: x["bbox"][1])
-
-        # Группируем близкие по вертикали элементы
-        grouped_elements = []
-        current_group = []
-        last_y = None
+def render_page(page_num, analysis, styles=None, images=None):
+    html = []
+    blocks = analysis.text_dict["blocks"]
 
-        for elem in elements:
-            if last_y is None or abs(elem["bbox"][1] - last_y) < 15:  # Группировка с допуском 15px
-                current_group.append(elem)
-            else:
-                if current_group:
-                    grouped_elements.append(current_group)
-                current_group = [elem]
-            last_y = elem["bbox"][1]
+    html.append(f'<div class="page" data-page="{page_num + 1}">')
 
-        if current_group:
-            grouped_elements.append(current_group)
+    # Собираем все элементы страницы
+    elements = []
 
-        # Рендерим элементы
-        for group in grouped_elements:
-            # Сортируем элементы в группе по горизонтали
-            group.sort(key=lambda x: x["bbox"][0])
+    for block in blocks:
+        if block["type"] == 0:  # Text block
+            text_lines = []
+            for line in block["lines"]:
+                line_text = []
+                if styles is None:
+                    for span in line["spans"]:
+                        line_text.append(f'<span style="{span_style(span)}">{span["text"]}</span>')
+                else:
+                    for style_str, group in coalesce(line["spans"], span_style):
+                        text = "".join(span["text"] for span in group)
+                        line_text.append(f'<span class="{styles(style_str)}">{text}</span>')
+                text_lines.append("".join(line_text))
+            elements.append({
+                "type": "text",
+                "bbox": block["bbox"],
+                "content": "<br>".join(text_lines),
+                "indent": block["bbox"][0] > 50  # Простое определение отступа
+            })
 
-            for elem in group:
-                if elem["type"] == "text":
-                    wrapper_class = "indent" if elem["indent"] else ""
-                    html.append(f'<div class="text-block {wrapper_class}">{elem["content"]}</div>')
-                elif elem["type"] == "table":
-                    html.append(f'<div class="table-wrapper">{elem["content"]}</div>')
+    # Картинки: байты не попадают в text dict, файлы пишет ImageStore
+    if images is not None:
+        for bbox, url in images.page_images(analysis.page):
+            elements.append({
+                "type": "image",
+                "bbox": bbox,
+                "content": images.img_tag(url, bbox)
+            })
 
-        html.append('</div>')
+    # Обрабатываем таблицы
+    tables = analysis.tables
+    for table in tables:
+        cells = table["rows"]
+        table_html = ['<table>']
+        for row in cells:
+            table_html.append('<tr>')
+            for cell in row:
+                table_html.append(f'<td>{cell}</td>')
+            table_html.append('</tr>')
+        table_html.append('</table>')
+
+        elements.append({
+            "type": "table",
+            "bbox": table["bbox"],
+            "content": "".join(table_html)
+        })
+
+    # Сортируем элементы по вертикальной позиции
+    elements.sort(key=lambda x: x["bbox"][1])
+
+    # Группируем близкие по вертикали элементы
+    grouped_elements = []
+    current_group = []
+    last_y = None
+
+    for elem in elements:
+        if last_y is None or abs(elem["bbox"][1] - last_y) < 15:  # Группировка с допуском 15px
+            current_group.append(elem)
+        else:
+            if current_group:
+                grouped_elements.append(current_group)
+            current_group = [elem]
+        last_y = elem["bbox"][1]
+
+    if current_group:
+        grouped_elements.append(current_group)
+
+    # Рендерим элементы
+    for group in grouped_elements:
+        # Сортируем элементы в группе по горизонтали
+        group.sort(key=lambda x: x["bbox"][0])
+
+        for elem in group:
+            if elem["type"] == "text":
+                wrapper_class = "indent" if elem["indent"] else ""
+                html.append(f'<div class="text-block {wrapper_class}">{elem["content"]}</div>')
+            elif elem["type"] == "table":
+                html.append(f'<div class="table-wrapper">{elem["content"]}</div>')
+            elif elem["type"] == "image":
+                html.append(f'<div class="image">{elem["content"]}</div>')
+
+    html.append('</div>')
+    # новые классы этой страницы - перед ней
+    css = styles.take_css() if styles is not None else ''
+    return [css] + html if css else html
+
+
+def iter_html(pdf_path, images=None):
+    """Документ по частям: заголовок, по одной части на страницу, конец.
+
+    images - common.images.ImageStore, None - картинки пропускаются.
+    """
+    doc = fitz.open(pdf_path)
+    yield HTML_HEAD
+    text_flags = fitz.TEXT_PRESERVE_WHITESPACE
+    styles = StyleTable() if INTERN_STYLES else None
+    for page_num, analysis in enumerate(iter_page_analyses(doc, TABLE_CACHE, text_flags, TABLE_PREFILTER)):
+        yield '\n'.join(render_page(page_num, analysis, styles, images))
+    yield HTML_TAIL
 
-    html.append('</body></html>')
 
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(html))
+def pdf_to_html(pdf_path, html_path):
+    images = ImageStore.for_output(html_path) if EXTRACT_IMAGES else None
+    with HtmlWriter(html_path) as out:
+        out.write_all(iter_html(pdf_path, images), sep='\n')
 
 
 # пример запуска
-pdf_to_html('example.pdf', 'output.html')
+if __name__ == "__main__":
+    pdf_to_html('example.pdf', 'output.html')
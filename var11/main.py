@@ -1,9 +1,37 @@
+import argparse
 import fitz  # PyMuPDF
 import re
 import html
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from common import instrument
+from common.cache import TableCache, file_digest
+from common.incremental import PageFingerprints, PageManifest, settings_digest, source_digests
+from common import layout
+from common.layout import Block, Line, Span, page_blocks
+from common.ocr_router import OcrRouter
+from common.page_cache import PageCache, parse_pages
+from common.page_analysis import PageAnalysis
+from common.spatial import BBoxIndex
+from common.table_prefilter import TablePrefilter
+from common.writer import HtmlWriter
 
 INPUT_PDF = "example.pdf"
 OUTPUT_HTML = "output.html"
+# Parallel conversion: number of worker processes and pages per task
+WORKERS = 1
+CHUNK_SIZE = 16
+# Table detection cache (common.cache.TableCache), None = disabled
+TABLE_CACHE = TableCache.from_env()
+# find_tables() only on pages with ruling lines (common.table_prefilter), None = every page
+TABLE_PREFILTER = TablePrefilter()
+# OCR of pages/images without a text layer (common.ocr_router): 'off' or 'auto'
+OCR_MODE = 'off'
+OCR_ROUTER = None
+# Fragments of pages converted on demand by convert_page_range (common.page_cache.PageCache)
+PAGE_CACHE = PageCache()
 
 CSS = '''<style type="text/css">
 .ev-t_table { border-collapse: collapse; border-top: 2px solid black; border-bottom: 2px solid black; border-right: none; border-left: none; width: 100%; margin-top: 3px; margin-bottom: 3px; font: 11px SimSun }
@@ -15,12 +43,16 @@ CSS = '''<style type="text/css">
 .ev-t_spacer {height: 24px;}
 </style>'''
 
-def extract_tables(page):
+HTML_HEAD = ["<!DOCTYPE html>", "<html lang='zh'>", "<head>", "<meta charset='UTF-8' />", "<title>PDF to HTML</title>", CSS, "</head>", "<body>"]
+HTML_TAIL = "</body></html>"
+
+@instrument.timed()
+def extract_tables(analysis):
     tables = []
-    for table in page.find_tables():
-        x0, y0, x1, y1 = table.bbox
-        rows = table.extract()
-        cell_bboxes = getattr(table, 'cells', None)
+    for table in analysis.tables:
+        x0, y0, x1, y1 = table['bbox']
+        rows = table['rows']
+        cell_bboxes = table['cell_bboxes']
         tables.append({
             'bbox': (x0, y0, x1, y1),
             'rows': rows,
@@ -30,76 +62,27 @@ def extract_tables(page):
         })
     return tables
 
-def extract_blocks_lines_spans(page):
-    blocks = []
-
-    for block in page.get_text("dict")['blocks']:
-        if block['type'] != 0:
-            continue
-        block_lines = []
-        for line in block['lines']:
-            line_spans = []
-            for span in line['spans']:
-                text = span['text']
-                if text.strip():
-                    line_spans.append({
-                        'text': text,
-                        'size': span['size'],
-                        'font': span['font'],
-                        'bbox': span['bbox'],
-                        'y': span['bbox'][1],
-                        'x': span['bbox'][0]
-                    })
-            if line_spans:
-                block_lines.append(line_spans)
-        if block_lines:
-            blocks.append(block_lines)
-    return blocks
+@instrument.timed()
+def extract_blocks_lines_spans(analysis):
+    # common.layout blocks -> lines -> spans, bboxes precomputed
+    return page_blocks(analysis.text_dict)
 
+def ocr_blocks(ocr_lines):
+    # OCR text lines in the shape of extract_blocks_lines_spans: one block per line, one span per line
+    return [Block([Line([Span(text, size, 'OCR', x0, y0, x1, y1)])]) for x0, y0, x1, y1, text, size in ocr_lines]
+
+@instrument.timed()
 def group_lines_to_paragraphs(lines, indent_tol=20, break_factor=1.5):
-    paragraphs = []
-    current_para = []
-    last_y = None
-    last_x = None
-    line_gaps = []
-    for i, line in enumerate(lines):
-        line_y = min(span['y'] for span in line)
-        if last_y is not None:
-            gap = line_y - last_y
-            line_gaps.append(gap)
-        last_y = line_y
-    # Calculate median gap
-    median_gap = sorted(line_gaps)[len(line_gaps)//2] if line_gaps else 12
-    last_y = None
-    last_x = None
-    for i, line in enumerate(lines):
-        line_y = min(span['y'] for span in line)
-        line_x = min(span['x'] for span in line)
-        if last_y is not None:
-            gap = line_y - last_y
-            indent = line_x - last_x if last_x is not None else 0
-            if gap > break_factor * median_gap or indent > indent_tol:
-                if current_para:
-                    paragraphs.append(current_para)
-                current_para = [line]
-            else:
-                current_para.append(line)
-        else:
-            current_para.append(line)
-        last_y = line_y
-        last_x = line_x
-    if current_para:
-        paragraphs.append(current_para)
-    return paragraphs
+    return layout.paragraphs([lines], indent_tol, break_factor)
 
-def is_overlap(b1, b2, tol=1.0):
-    return not (b1[2] < b2[0] - tol or b1[0] > b2[2] + tol or b1[3] < b2[1] - tol or b1[1] > b2[3] + tol)
+@instrument.timed()
+def group_blocks_to_paragraphs(blocks, indent_tol=20, break_factor=1.5):
+    # group_lines_to_paragraphs() for every block of the page in one pass
+    return layout.paragraphs(blocks, indent_tol, break_factor)
 
 def classify_paragraph(paragraph):
-    first_line = paragraph[0] if isinstance(paragraph[0], list) else paragraph[0]['line']
-    first_span = first_line[0]
-    size = first_span['size']
-    text = ''.join(span['text'] for line in (l if isinstance(l, list) else l['line'] for l in paragraph) for span in line)
+    size = paragraph[0][0].size
+    text = ''.join(line.text for line in paragraph)
     if size >= 20 or (re.match(r'[表|图]\d', text) and size >= 16):
         return 'h1'
     if '注:' in text or '资料来源' in text:
@@ -108,6 +91,7 @@ def classify_paragraph(paragraph):
         return 'spacer'
     return 'par'
 
+@instrument.timed()
 def detect_merged_cells(table_rows):
     n_rows = len(table_rows)
     n_cols = max(len(row) for row in table_rows)
@@ -134,6 +118,7 @@ def detect_merged_cells(table_rows):
             r += 1
     return grid, n_rows, n_cols
 
+@instrument.timed()
 def detect_merged_cells_bbox(table_rows, cell_bboxes):
     n_rows = len(table_rows)
     n_cols = max(len(row) for row in table_rows)
@@ -180,8 +165,13 @@ def detect_merged_cells_bbox(table_rows, cell_bboxes):
             else:
                 grid[r][c]['used'] = True
 
-    # Debug print
-    print('DEBUG: Merged cell structure (after bbox analysis):')
+    if instrument.debug_enabled():
+        print_merge_grid(grid, n_rows, n_cols)
+
+    return grid, n_rows, n_cols
+
+def print_merge_grid(grid, n_rows, n_cols):
+    instrument.debug('Merged cell structure (after bbox analysis):')
     for r in range(n_rows):
         row_repr = []
         for c in range(n_cols):
@@ -197,17 +187,16 @@ def detect_merged_cells_bbox(table_rows, cell_bboxes):
                 row_repr.append(rc_info or '1')
         print(' '.join(row_repr))
 
-    return grid, n_rows, n_cols
-
+@instrument.timed()
 def render_table(table):
     table_rows = table['rows']
     cell_bboxes = table.get('cell_bboxes', None)
     if cell_bboxes:
-        print(f"DEBUG: table['cell_bboxes'] = {cell_bboxes}")
-        print("DEBUG: Using bbox-based merged cell detection.")
+        instrument.debug("table['cell_bboxes'] = %s", cell_bboxes)
+        instrument.debug("Using bbox-based merged cell detection.")
         grid, n_rows, n_cols = detect_merged_cells_bbox(table_rows, cell_bboxes)
     else:
-        print("DEBUG: No cell_bboxes found for table, using text-based merge heuristic.")
+        instrument.debug("No cell_bboxes found for table, using text-based merge heuristic.")
         grid, n_rows, n_cols = detect_merged_cells(table_rows)
     html_out = ["<table class='ev-t_table'><tbody class='ev-t_tbody'>"]
     for r in range(n_rows):
@@ -230,15 +219,10 @@ def render_table(table):
 
 def detect_alignment(paragraph, page_width=650):
     # Use all lines in the paragraph for alignment detection
-    all_spans = []
-    for line in paragraph:
-        if isinstance(line, dict) and line.get('br'):
-            line = line['line']
-        all_spans.extend(line)
-    if not all_spans:
+    if not paragraph:
         return 'left'
-    x0 = min(span['x'] for span in all_spans)
-    x1 = max(span['x'] + (span['bbox'][2] - span['bbox'][0]) for span in all_spans)
+    x0 = min(line.x0 for line in paragraph)
+    x1 = max(line.x1 for line in paragraph)
     text_width = x1 - x0
     left_margin = x0
     right_margin = page_width - x1
@@ -255,35 +239,34 @@ def merge_heading_spans(line):
     merged = []
     i = 0
     while i < len(line):
-        if line[i]['text'].isdigit():
-            num_str = line[i]['text']
+        if line[i].text.isdigit():
+            num_str = line[i].text
             j = i + 1
-            while j < len(line) and line[j]['text'].isdigit():
-                num_str += line[j]['text']
+            while j < len(line) and line[j].text.isdigit():
+                num_str += line[j].text
                 j += 1
-            merged.append({'text': num_str})
+            merged.append(num_str)
             i = j
         else:
-            merged.append(line[i])
+            merged.append(line[i].text)
             i += 1
-    return ''.join(span['text'] for span in merged)
+    return ''.join(merged)
 
-def render_paragraph(paragraph, page_width=650):
+@instrument.timed()
+def render_paragraph(paragraph, page_width=650, align=None):
     cls = classify_paragraph(paragraph)
-    align = detect_alignment(paragraph, page_width)
+    if align is None:
+        align = detect_alignment(paragraph, page_width)
     align_style = ''
     if align == 'center':
         align_style = ' style="text-align:center;"'
     elif align == 'right':
         align_style = ' style="text-align:right;"'
     lines_html = []
-    for idx, line in enumerate(paragraph):
-        if isinstance(line, dict) and line.get('br'):
-            lines_html.append('<br>')
-            line = line['line']
+    for line in paragraph:
         # Always sort by x for headings and normal paragraphs
-        sorted_line = sorted(line, key=lambda span: span['x'])
-        line_text = html.escape(''.join(span['text'] for span in sorted_line))
+        sorted_line = sorted(line, key=lambda span: span.x0)
+        line_text = html.escape(''.join(span.text for span in sorted_line))
         lines_html.append(line_text)
     text = ' '.join(lines_html)
     if cls == 'h1':
@@ -301,17 +284,18 @@ def is_mostly_cjk(text):
 
 def best_cjk_order(line):
     # Try both original and x-sorted order, pick the one with the longest run of CJK
-    orig = ''.join(span['text'] for span in line)
-    sorted_line = sorted(line, key=lambda span: span['x'])
-    xsort = ''.join(span['text'] for span in sorted_line)
+    orig = line.text
+    sorted_line = sorted(line, key=lambda span: span.x0)
+    xsort = ''.join(span.text for span in sorted_line)
     def max_cjk_run(s):
         runs = re.findall(r'[\u4e00-\u9fff]+', s)
         return max((len(run) for run in runs), default=0)
     return orig if max_cjk_run(orig) >= max_cjk_run(xsort) else xsort
 
-def extract_visual_page_number(page):
-    height = page.rect.height
-    blocks = page.get_text("blocks")
+@instrument.timed()
+def extract_visual_page_number(analysis):
+    height = analysis.rect.height
+    blocks = analysis.blocks
     bottom_blocks = [b for b in blocks if b[1] > height * 0.85]
     for b in bottom_blocks:
         text = b[4].strip()
@@ -320,37 +304,40 @@ def extract_visual_page_number(page):
             return text
     return None
 
-def process_page(page, page_num):
-    tables = extract_tables(page)
-    table_bboxes = [t['bbox'] for t in tables]
-    blocks = extract_blocks_lines_spans(page)
+@instrument.timed()
+def process_page(page, page_num, pdf_name=INPUT_PDF):
+    instrument.set_page(page_num)
+    # All PyMuPDF extraction for this page goes through one PageAnalysis
+    analysis = PageAnalysis(page, TABLE_CACHE, table_filter=TABLE_PREFILTER)
+    tables = extract_tables(analysis)
+    blocks = extract_blocks_lines_spans(analysis)
+    if OCR_ROUTER is not None:
+        ocr_lines, ocr_tables = OCR_ROUTER.ocr_page(analysis)
+        tables.extend({**t, 'y': t['bbox'][1], 'x': t['bbox'][0]} for t in ocr_tables)
+        blocks.extend(ocr_blocks(ocr_lines))
+    table_index = BBoxIndex([t['bbox'] for t in tables])
     filtered_blocks = []
     page_number_elements = []
     heading_elements = []
 
-    for index, block in enumerate(blocks):
-        block_bbox = [
-            min(span['x'] for line in block for span in line),
-            min(span['y'] for line in block for span in line),
-            max(span['x'] + (span['bbox'][2] - span['bbox'][0]) for line in block for span in line),
-            max(span['y'] + (span['bbox'][3] - span['bbox'][1]) for line in block for span in line)
-        ]
+    for block in blocks:
+        block_bbox = block.bbox
         first_line = block[0]
-        sorted_spans = sorted(first_line, key=lambda span: span['x'])
-        text = ''.join(span['text'] for span in sorted_spans).strip()
+        sorted_spans = sorted(first_line, key=lambda span: span.x0)
+        text = ''.join(span.text for span in sorted_spans).strip()
         is_digits = text.isdigit()
-        is_top = block_bbox[1] < 100
-        is_large = first_line[0]['size'] > 16 if first_line else False
+        is_top = block.y0 < 100
+        is_large = first_line[0].size > 16
         # Heuristic: CJK heading
-        orig = ''.join(span['text'] for span in first_line)
+        orig = first_line.text
         cjk_heading = is_top and is_mostly_cjk(orig) and len(orig) > 6
         if is_digits and is_top and is_large:
-            page_number_elements.append({'type': 'pagenum', 'y': block_bbox[1], 'x': block_bbox[0], 'text': text})
+            page_number_elements.append({'type': 'pagenum', 'y': block.y0, 'x': block.x0, 'text': text})
         elif cjk_heading:
             best_text = best_cjk_order(first_line)
-            heading_elements.append({'type': 'heading', 'y': block_bbox[1], 'x': block_bbox[0], 'text': best_text})
+            heading_elements.append({'type': 'heading', 'y': block.y0, 'x': block.x0, 'text': best_text})
         else:
-            if not any(is_overlap(block_bbox, tb) for tb in table_bboxes):
+            if not table_index.any_overlap(block_bbox):
                 filtered_blocks.append(block)
     elements = []
     for t in tables:
@@ -359,15 +346,12 @@ def process_page(page, page_num):
         elements.append(elem)
     for elem in heading_elements:
         elements.append(elem)
-    for block in filtered_blocks:
-        lines = block
-        paragraphs = group_lines_to_paragraphs(lines)
-        for p in paragraphs:
-            y = p[0][0]['y'] if isinstance(p[0], list) else p[0]['line'][0]['y']
-            x = p[0][0]['x'] if isinstance(p[0], list) else p[0]['line'][0]['x']
-            elements.append({'type': 'text', 'y': y, 'x': x, 'paragraph': p})
+    paragraphs = group_blocks_to_paragraphs(filtered_blocks)
+    for p, align in zip(paragraphs, layout.alignments(paragraphs)):
+        # position of the first span of the paragraph, as in the PDF
+        elements.append({'type': 'text', 'y': p[0][0].y0, 'x': p[0][0].x0, 'paragraph': p, 'align': align})
     elements.sort(key=lambda e: (e['y'], e['x']))
-    html_out = [f'<pagemark number="{page_num+1}" pagepdf="{INPUT_PDF}"/>']
+    html_out = [f'<pagemark number="{page_num+1}" pagepdf="{pdf_name}"/>']
     html_out.append("<div class='ev-t_page'>")
     for el in elements:
         if el['type'] == 'table':
@@ -377,22 +361,212 @@ def process_page(page, page_num):
         elif el['type'] == 'heading':
             html_out.append(f"<p class='ev-t_h1' style='text-align:center;'>{html.escape(el['text'])}</p>")
         else:
-            html_out.append(render_paragraph(el['paragraph']))
+            html_out.append(render_paragraph(el['paragraph'], align=el['align']))
     html_out.append("</div>")
-    visual_num = extract_visual_page_number(page)
+    visual_num = extract_visual_page_number(analysis)
+    analysis.release()
     if visual_num:
         html_out.append(f"<div class='ev-t_footer' style='text-align:center;color:#888;font-size:12px;margin-top:20px;'>Страница {visual_num}</div>")
     return "\n".join(html_out)
 
+# Each worker process opens its own copy of the document once
+_worker_doc = None
+_worker_pdf_name = None
+
+def _init_worker(pdf_path, pdf_name, cache_dir, table_prefilter, ocr_mode, instrument_config):
+    global _worker_doc, _worker_pdf_name, TABLE_CACHE, TABLE_PREFILTER
+    _worker_doc = fitz.open(pdf_path)
+    _worker_pdf_name = pdf_name
+    TABLE_CACHE = TableCache(cache_dir) if cache_dir else None
+    TABLE_PREFILTER = TablePrefilter(**table_prefilter) if table_prefilter else None
+    set_ocr_mode(ocr_mode)
+    instrument.init_worker(instrument_config)
+
+def _convert_chunk(page_indices):
+    hits, misses = (TABLE_CACHE.hits, TABLE_CACHE.misses) if TABLE_CACHE else (0, 0)
+    fragments = [process_page(_worker_doc[i], i, _worker_pdf_name) for i in page_indices]
+    if TABLE_CACHE:
+        hits, misses = TABLE_CACHE.hits - hits, TABLE_CACHE.misses - misses
+    prefilter = None
+    if TABLE_PREFILTER is not None:
+        prefilter = TABLE_PREFILTER.stats()
+        TABLE_PREFILTER.checked = TABLE_PREFILTER.skipped = 0
+    ocr = None
+    if OCR_ROUTER is not None:
+        ocr = OCR_ROUTER.stats()
+        OCR_ROUTER.pages = OCR_ROUTER.regions = OCR_ROUTER.skipped = 0
+    timings = instrument.drain() if instrument.enabled() else None
+    return fragments, hits, misses, prefilter, ocr, timings
+
+def convert_pages(pdf_path, pdf_name=INPUT_PDF, workers=WORKERS, chunk_size=CHUNK_SIZE, pages=None):
+    """Yield the HTML fragment of every page (or of the page indices in pages) in order.
+
+    With workers > 1 the pages are split into chunks of chunk_size and
+    converted in a process pool; fragments are still yielded in page order,
+    so the result is identical to the serial run.
+    """
+    with fitz.open(pdf_path) as doc:
+        pages = list(range(len(doc))) if pages is None else list(pages)
+        if workers <= 1 or len(pages) <= chunk_size:
+            for i in pages:
+                yield process_page(doc[i], i, pdf_name)
+            return
+    chunks = [pages[start:start + chunk_size] for start in range(0, len(pages), chunk_size)]
+    cache_dir = TABLE_CACHE.directory if TABLE_CACHE else None
+    prefilter = TABLE_PREFILTER.settings() if TABLE_PREFILTER is not None else None
+    initargs = (pdf_path, pdf_name, cache_dir, prefilter, OCR_MODE, instrument.worker_config())
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        # Keep at most two chunks per worker in flight so finished pages do not pile up
+        # in memory; futures are consumed in submission order.
+        pending = deque()
+        chunks = iter(chunks)
+        for chunk in islice(chunks, 2 * workers):
+            pending.append(pool.submit(_convert_chunk, chunk))
+        while pending:
+            fragments, hits, misses, prefilter, ocr, timings = pending.popleft().result()
+            # Counters of the worker processes are reported back to the parent
+            if TABLE_CACHE:
+                TABLE_CACHE.hits += hits
+                TABLE_CACHE.misses += misses
+            if prefilter and TABLE_PREFILTER is not None:
+                TABLE_PREFILTER.checked += prefilter['checked']
+                TABLE_PREFILTER.skipped += prefilter['skipped']
+            if ocr and OCR_ROUTER is not None:
+                OCR_ROUTER.pages += ocr['pages']
+                OCR_ROUTER.regions += ocr['regions']
+                OCR_ROUTER.skipped += ocr['skipped']
+            if timings:
+                instrument.merge(timings)
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(_convert_chunk, chunk))
+            yield from fragments
+
+def set_ocr_mode(mode):
+    """'auto': OCR pages and image regions that have no text layer; 'off': never OCR."""
+    global OCR_MODE, OCR_ROUTER
+    if mode not in ('off', 'auto'):
+        raise ValueError(f"unknown OCR mode: {mode!r}")
+    OCR_MODE = mode
+    OCR_ROUTER = OcrRouter() if mode == 'auto' else None
+
+# Modules whose code shapes a page fragment (page_settings); OCR_MODULES only with OCR on
+COMMON_MODULES = ('common.cache', 'common.layout', 'common.page_analysis', 'common.spatial', 'common.table_prefilter')
+OCR_MODULES = ('common.ocr_router', 'var8.main')
+
+def page_settings(pdf_name):
+    # Everything besides the page itself that changes a page fragment, this file and the common modules included
+    modules = COMMON_MODULES + (OCR_MODULES if OCR_MODE != 'off' else ())
+    return settings_digest(converter=file_digest(__file__), common=source_digests(*modules), pdf_name=pdf_name,
+                           ocr=OCR_MODE, fitz=fitz.VersionBind,
+                           table_prefilter=TABLE_PREFILTER.settings() if TABLE_PREFILTER is not None else None)
+
+def iter_incremental_pages(pdf_path, pdf_name, manifest, workers=WORKERS, chunk_size=CHUNK_SIZE):
+    """Fragments of all pages; pages unchanged since the manifest was written are not converted."""
+    with fitz.open(pdf_path) as doc:
+        fingerprints = PageFingerprints(doc)
+        fingerprints = [fingerprints.page(i) for i in range(len(doc))]
+    entries = [manifest.lookup(i, fp) for i, fp in enumerate(fingerprints)]
+    changed = [i for i, entry in enumerate(entries) if entry is None]
+    converted = convert_pages(pdf_path, pdf_name, workers, chunk_size, changed)
+    for i, entry in enumerate(entries):
+        if entry is None:
+            fragment = next(converted)
+            manifest.record(i, fingerprints[i], fragment)
+        else:
+            fragment = manifest.fragment(entry)
+            manifest.reuse(i, entry)
+        yield fragment
+    manifest.save()
+
+def convert_page_range(pdf_path, pages, pdf_name=None, cache=PAGE_CACHE):
+    """HTML fragments of the page indices in pages (0-based), converted on demand.
+
+    Only these pages are analysed (text, tables, OCR); their fragments are kept
+    in cache, so the same pages of the same document come back without any
+    PDF work. cache=None converts every time.
+    """
+    pdf_name = pdf_name or pdf_path
+    pages = list(pages)
+    def convert_missing(missing):
+        return list(convert_pages(pdf_path, pdf_name, workers=1, pages=missing))
+    if cache is None:
+        return convert_missing(pages)
+    return cache.get_pages((file_digest(pdf_path), 'var11', page_settings(pdf_name)), pages, convert_missing)
+
+def iter_html(pdf_path, pdf_name=None, workers=WORKERS, chunk_size=CHUNK_SIZE, manifest=None, pages=None):
+    """Yield the document as a sequence of chunks to be joined with newlines.
+
+    manifest (common.incremental.PageManifest) enables incremental conversion;
+    pages (0-based indices) limits the output to those pages.
+    """
+    yield "\n".join(HTML_HEAD)
+    if manifest is None:
+        yield from convert_pages(pdf_path, pdf_name or pdf_path, workers, chunk_size, pages)
+    else:
+        yield from iter_incremental_pages(pdf_path, pdf_name or pdf_path, manifest, workers, chunk_size)
+    yield HTML_TAIL
+
+def convert(pdf_path, output, workers=WORKERS, chunk_size=CHUNK_SIZE, incremental=False, pages=None):
+    """Convert pdf_path and stream the HTML into output (a path or a writable text stream).
+
+    incremental: keep a page manifest next to output (a path) and convert only changed pages.
+    pages: convert only these page indices (0-based). Returns the manifest, if any.
+    """
+    if incremental and pages is not None:
+        raise ValueError("incremental conversion covers the whole document, not a page range")
+    manifest = PageManifest(output, page_settings(pdf_path)) if incremental else None
+    with HtmlWriter(output) as out:
+        out.write_all(iter_html(pdf_path, pdf_path, workers, chunk_size, manifest, pages), sep="\n")
+    return manifest
+
 def main():
-    doc = fitz.open(INPUT_PDF)
-    html_out = ["<!DOCTYPE html>", "<html lang='zh'>", "<head>", "<meta charset='UTF-8' />", "<title>PDF to HTML</title>", CSS, "</head>", "<body>"]
-    for i, page in enumerate(doc):
-        html_out.append(process_page(page, i))
-    html_out.append("</body></html>")
-    with open(OUTPUT_HTML, "w", encoding="utf-8") as f:
-        f.write("\n".join(html_out))
-    print(f"Wrote {OUTPUT_HTML}")
+    global TABLE_CACHE, TABLE_PREFILTER
+    parser = argparse.ArgumentParser(description="Convert PDF to HTML")
+    parser.add_argument("input", nargs="?", default=INPUT_PDF)
+    parser.add_argument("output", nargs="?", default=OUTPUT_HTML)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="pages per worker task")
+    parser.add_argument("--cache-dir", help="directory of the table detection cache")
+    parser.add_argument("--table-prefilter", type=int, default=TABLE_PREFILTER.min_rules, metavar="N",
+                        help="detect tables only on pages with at least N horizontal and N vertical rulings (0 = every page)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="reuse fragments of pages unchanged since the last run (manifest next to output)")
+    parser.add_argument("--pages", help="convert only these pages, e.g. 120-125,130 (1-based)")
+    parser.add_argument("--ocr", choices=("off", "auto"), default=OCR_MODE,
+                        help="auto: OCR pages and images without a text layer (needs var8 dependencies)")
+    parser.add_argument("--report", help="write per-stage/per-page timings (JSON) to this file")
+    parser.add_argument("--trace", help="write a Chrome trace of all stages to this file")
+    parser.add_argument("--cprofile", help="write cProfile stats to this file")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="add memory statistics to the report (printed when there is no --report)")
+    parser.add_argument("--debug", action="store_true", help="print table merge diagnostics")
+    args = parser.parse_args()
+    if args.cache_dir:
+        TABLE_CACHE = TableCache(args.cache_dir)
+    TABLE_PREFILTER = TablePrefilter(min_rules=args.table_prefilter) if args.table_prefilter > 0 else None
+    outputs = instrument.configure_from_env()
+    if args.report or args.trace or args.cprofile or args.tracemalloc:
+        instrument.enable(trace=bool(args.trace), cprofile=bool(args.cprofile), memory=args.tracemalloc)
+        outputs = {'report': args.report, 'trace': args.trace, 'cprofile': args.cprofile}
+    if args.debug:
+        instrument.set_debug()
+    set_ocr_mode(args.ocr)
+    pages = None
+    if args.pages:
+        with fitz.open(args.input) as doc:
+            pages = parse_pages(args.pages, len(doc))
+    manifest = convert(args.input, args.output, args.workers, args.chunk_size, args.incremental, pages)
+    print(f"Wrote {args.output}")
+    if manifest:
+        print(f"Pages: {manifest.stats()}")
+    if TABLE_CACHE:
+        print(f"Table cache: {TABLE_CACHE.stats()}")
+    if TABLE_PREFILTER is not None:
+        print(f"Table prefilter: {TABLE_PREFILTER.stats()}")
+    if OCR_ROUTER is not None:
+        print(f"OCR: {OCR_ROUTER.stats()}")
+    if instrument.enabled():
+        instrument.finish(outputs['report'], outputs['trace'], outputs['cprofile'])
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -1,40 +1,78 @@
+import html
 
 import fitz  # PyMuPDF
-from bs4 import BeautifulSoup
 
-def generate_precise_html(pdf_path, output_html):
-    doc = fitz.open(pdf_path)
-    soup = BeautifulSoup('<html><head><meta charset="utf-8"><style>body{margin:0;position:relative;} .txt{position:absolute;white-space:pre;}</style></head><body></body></html>', 'html.parser')
-    body = soup.body
+from common.images import ImageStore
+from common.styles import StyleTable, coalesce
+from common.writer import HtmlWriter
+
+HTML_HEAD = '<html><head><meta charset="utf-8"><style>body{margin:0;position:relative;} .txt{position:absolute;white-space:pre;} .img{position:absolute;}</style></head><body>'
+HTML_TAIL = '</body></html>'
+# шрифт/размер/цвет выносятся в CSS-классы, вплотную стоящие спаны одного стиля
+# на строке склеиваются в один div; False - как раньше, всё в style="..."
+INTERN_STYLES = True
+# спаны склеиваются, если между ними не больше GAP_TOL px
+GAP_TOL = 0.5
+# картинки пишутся файлами в <имя html>_images/ и ставятся на свои места <img loading="lazy">
+EXTRACT_IMAGES = True
+
+def attr(value):
+    # значение атрибута в двойных кавычках
+    return html.escape(value, quote=False).replace('"', '&quot;')
+
+def span_style(span):
+    return (
+        f"font-size:{span['size']}px;"
+        f"font-family:'{span['font']}';"
+        f"color:#{int(span['color']):06x};"
+    )
+
+def touching(prev, span):
+    return span['bbox'][1] == prev['bbox'][1] and abs(span['bbox'][0] - prev['bbox'][2]) <= GAP_TOL
 
-    for page_num, page in enumerate(doc, start=1):
-        page_div = soup.new_tag('div', **{'style': f'position:relative; width:{page.rect.width}px; height:{page.rect.height}px; border-bottom:1px dashed #ccc; margin-bottom:20px;'})
+def render_page(page, styles=None, images=None):
+    out = [f'<div style="position:relative; width:{page.rect.width}px; height:{page.rect.height}px; border-bottom:1px dashed #ccc; margin-bottom:20px;">']
 
-        text_blocks = page.get_text("dict")["blocks"]
-        for block in text_blocks:
-            if "lines" in block:
-                for line in block["lines"]:
+    # без TEXT_PRESERVE_IMAGES: картинки не декодируются в dict, их пишет ImageStore
+    text_blocks = page.get_text("dict", flags=fitz.TEXTFLAGS_DICT & ~fitz.TEXT_PRESERVE_IMAGES)["blocks"]
+    for block in text_blocks:
+        if "lines" in block:
+            for line in block["lines"]:
+                if styles is None:
                     for span in line["spans"]:
-                        style = (
-                            f"left:{span['bbox'][0]}px;"
-                            f"top:{span['bbox'][1]}px;"
-                            f"font-size:{span['size']}px;"
-                            f"font-family:'{span['font']}';"
-                            f"color:#{int(span['color']):06x};"
-                        )
-                        span_tag = soup.new_tag("div", **{"class": "txt", "style": style})
-                        span_tag.string = span["text"]
-                        page_div.append(span_tag)
-            elif "image" in block:
-                # опционально вставка изображения — можно расширить здесь
-                pass
-
-        body.append(page_div)
-
-    with open(output_html, "w", encoding="utf-8") as f:
-        f.write(str(soup.prettify()))
-    print(f"✅ HTML сохранён: {output_html}")
+                        style = f"left:{span['bbox'][0]}px;top:{span['bbox'][1]}px;" + span_style(span)
+                        out.append(f'<div class="txt" style="{attr(style)}">{html.escape(span["text"], quote=False)}</div>')
+                    continue
+                for style, group in coalesce(line["spans"], span_style, touching):
+                    left, top = group[0]['bbox'][0], group[0]['bbox'][1]
+                    text = html.escape(''.join(span["text"] for span in group), quote=False)
+                    out.append(f'<div class="txt {styles(style)}" style="left:{left}px;top:{top}px;">{text}</div>')
+    if images is not None:
+        for bbox, url in images.page_images(page):
+            out.append(images.img_tag(url, bbox, f'left:{bbox[0]}px;top:{bbox[1]}px;', 'img'))
+    out.append('</div>')
+    # новые классы этой страницы - перед ней
+    css = styles.take_css() if styles is not None else ''
+    return [css] + out if css else out
+
+def iter_html(pdf_path, images=None):
+    """Документ по частям: заголовок, по одной части на страницу, конец.
 
-generate_precise_html("pdf2html_test_tables-3.pdf", "exact_output.html")
+    images - common.images.ImageStore, None - картинки пропускаются.
+    """
+    with fitz.open(pdf_path) as doc:
+        yield HTML_HEAD
+        styles = StyleTable() if INTERN_STYLES else None
+        for page in doc:
+            yield "\n".join(render_page(page, styles, images))
+        yield HTML_TAIL
 
+def generate_precise_html(pdf_path, output_html):
+    # каждая страница пишется сразу, без дерева BeautifulSoup и prettify() всего документа
+    images = ImageStore.for_output(output_html) if EXTRACT_IMAGES else None
+    with HtmlWriter(output_html) as out:
+        out.write_all(iter_html(pdf_path, images), sep="\n")
+    print(f"✅ HTML сохранён: {output_html}")
 
+if __name__ == "__main__":
+    generate_precise_html("pdf2html_test_tables-3.pdf", "exact_output.html")
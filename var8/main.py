@@ -41,14 +41,57 @@ img_path = "tmp_images/page_001.png"
 
 
 import cv2
+import fitz  # pip install PyMuPDF
 import numpy as np
 import pytesseract
 from pytesseract import Output
 import html
+from collections import defaultdict
+from concurrent.futures import Future
 
-def detect_table_cells(img, debug=False):
-    # 1. Серый + бинаризация инверсией
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+from common.spatial import BBoxIndex
+
+OCR_LANG = 'chi_sim+chi_tra+eng+rus'
+# True: один вызов tesseract на всю область таблицы, слова раскладываются по ячейкам
+# по координатам; False: отдельный вызов на каждую ячейку (ocr_cell)
+BATCH_OCR = True
+# разрешение растеризации страниц PDF
+DPI = 500
+# масштаб картинки для поиска линий таблиц (1 - полный размер); на DPI 500 линии толстые,
+# в 2 раза меньшая картинка почти не теряет точности. Общий для var8.main и var8.pipeline
+DETECT_SCALE = 0.5
+
+class PixmapImage(np.ndarray):
+    """Картинка страницы поверх памяти fitz.Pixmap, без копирования.
+
+    memoryview пиксмапа не держит сам пиксмап, поэтому ссылка на него
+    хранится в массиве (и во всех его срезах через .base).
+    """
+    pixmap = None
+
+    def __array_finalize__(self, obj):
+        self.pixmap = getattr(obj, 'pixmap', None)
+
+def render_page_image(page, dpi=DPI, clip=None):
+    """Страница PDF (или её область clip) в оттенках серого: массив (h, w) uint8 без PNG и диска."""
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False, clip=clip)
+    img = np.ndarray((pix.height, pix.width), dtype=np.uint8, buffer=pix.samples_mv,
+                     strides=(pix.stride, 1)).view(PixmapImage)
+    img.pixmap = pix
+    return img
+
+def iter_page_images(pdf_path, dpi=DPI):
+    """Страницы по одной, следующая растеризуется только по запросу."""
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            yield render_page_image(page, dpi)
+
+def to_gray(img):
+    # BGR (cv2.imread) или уже серая картинка (render_page_image)
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+def line_mask(gray):
+    # 1. Бинаризация инверсией
     binar = cv2.adaptiveThreshold(
         ~gray, 255,
         cv2.ADAPTIVE_THRESH_MEAN_C,
@@ -71,35 +114,109 @@ def detect_table_cells(img, debug=False):
     vert = cv2.erode(vert, kern_v)
     vert = cv2.dilate(vert, kern_v)
 
-    # 4. Пересечение = маска клеток
-    mask = cv2.bitwise_and(horiz, vert)
+    # 4. Объединение = сетка линий таблиц
+    return cv2.bitwise_or(horiz, vert)
+
+def find_cells(lines, min_w=30, min_h=20, scale=1.0):
+    """Ячейки - области, со всех сторон замкнутые линиями: (boxes (n, 4), маска таблиц).
+
+    Объединённая ячейка - одна такая область на несколько строк/столбцов сетки.
+    Области, касающиеся края картинки, - фон страницы, не ячейки. Размеры
+    min_w/min_h и результат - в пикселях картинки до уменьшения в scale раз.
+    """
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(cv2.bitwise_not(lines), connectivity=4)
+    height, width = lines.shape
+    x, y, w, h = stats[:, 0], stats[:, 1], stats[:, 2], stats[:, 3]
+    keep = (x > 0) & (y > 0) & (x + w < width) & (y + h < height)
+    keep &= (w > min_w * scale) & (h > min_h * scale)
+    keep[0] = False  # метка 0 - сами линии
+    boxes = stats[keep, :4]
+    if scale != 1:
+        boxes = np.rint(boxes / scale).astype(int)
+    # маска таблиц: линии + ячейки, свободный текст распознаётся вне её
+    mask = np.where(keep[labels] | (lines > 0), 255, 0).astype(np.uint8)
+    return boxes, mask
+
+def group_rows(cells, tol=10):
+    """Ячейки (x, y, w, h) по строкам: строка начинается с самой верхней ещё не
+    разобранной ячейки и забирает все, у кого y меньше её y + tol; внутри строки по x.
+
+    На отсортированных y подходить может только последняя начатая строка, поэтому
+    границы строк ищутся через searchsorted, а не сравнением со всеми строками.
+    """
+    boxes = np.asarray(cells).reshape(-1, 4)
+    if not len(boxes):
+        return []
+    boxes = boxes[np.lexsort((boxes[:, 0], boxes[:, 1]))]
+    ys = boxes[:, 1]
+    starts = []
+    start = 0
+    while start < len(ys):
+        starts.append(start)
+        start = int(np.searchsorted(ys, ys[start] + tol, 'left'))
+    # номер строки каждой ячейки, затем сортировка по (строка, x) с сохранением порядка по y
+    row_ids = np.zeros(len(boxes), dtype=int)
+    row_ids[starts[1:]] = 1
+    row_ids = np.cumsum(row_ids)
+    boxes = boxes[np.lexsort((boxes[:, 0], row_ids))]
+    flat = [tuple(b) for b in boxes.tolist()]
+    bounds = starts + [len(flat)]
+    return [flat[a:b] for a, b in zip(bounds, bounds[1:])]
+
+def column_rulings(grid, rows, tol=10):
+    """x внутренних вертикальных линий таблицы из строк rows сетки grid.
+
+    Линия между соседними в строке ячейками - середина между правым краем левой
+    и левым краем правой, так что толщина линии (на 500 DPI - десяток пикселей и
+    больше) не важна; середины из разных строк ближе tol друг к другу - одна линия.
+    """
+    mids = np.sort([(a[0] + a[2] + b[0]) / 2 for r in rows for a, b in zip(grid[r], grid[r][1:])])
+    if not len(mids):
+        return mids
+    line = np.concatenate(([0], np.cumsum(np.diff(mids) > tol)))
+    return np.bincount(line, weights=mids) / np.bincount(line)
+
+def grid_spans(grid):
+    """colspan каждой ячейки grid: число линий своей таблицы, которые она перекрывает, плюс один.
+
+    Объединённая ячейка - один контур на маске, внутри него проходят линии
+    соседних строк. Строки одной таблицы разделены линией, поэтому к зазору
+    между таблицами добавляется толщина линии (медианный зазор между ячейками
+    строки). rowspan не считается: каждая строка выводится отдельной таблицей.
+    """
+    spans = [[1] * len(row) for row in grid]
+    gaps = [b[0] - a[0] - a[2] for row in grid for a, b in zip(row, row[1:])]
+    thickness = float(np.median(gaps)) if gaps else 0
+    for _, rows in table_regions(grid, gap=10 + thickness):
+        rulings = column_rulings(grid, rows)
+        for r in rows:
+            for c, (x, _, w, _) in enumerate(grid[r]):
+                spans[r][c] = 1 + int(np.count_nonzero((rulings > x) & (rulings < x + w)))
+    return spans
+
+def detect_table_cells(img, debug=False, scale=DETECT_SCALE):
+    """Ячейки таблиц с линиями: (grid, mask), grid - строки [(x, y, w, h), ...].
+
+    scale < 1 - линии ищутся на уменьшенной картинке (на 500 DPI линии толстые,
+    0.5 почти не теряет точности), рамки и маска переводятся обратно в полный размер.
+    """
+    gray = to_gray(img)
+    if scale != 1:
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    lines = line_mask(gray)
+
+    # 5. Ячейки - замкнутые линиями области
+    cells, mask = find_cells(lines, scale=scale)
+    if scale != 1:
+        mask = cv2.resize(mask, (img.shape[1], img.shape[0]), interpolation=cv2.INTER_NEAREST)
     if debug:
         cv2.imwrite("table_mask.png", mask)
 
-    # 5. Поиск контуров ячеек
-    cnts, _ = cv2.findContours(mask, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    boxes = [cv2.boundingRect(c) for c in cnts]
-    # отбрасываем слишком мелкие
-    cells = [b for b in boxes if b[2] > 30 and b[3] > 20]
-
-    # 6. Группируем ячейки в строки по y
-    cells.sort(key=lambda b:(b[1], b[0]))
-    rows = []
-    tol = 10
-    for x,y,w,h in cells:
-        placed = False
-        for row in rows:
-            if abs(row[0][1] - y) < tol:
-                row.append((x,y,w,h))
-                placed = True
-                break
-        if not placed:
-            rows.append([(x,y,w,h)])
-    # сортируем столбцы по x
-    grid = [sorted(r, key=lambda b:b[0]) for r in rows]
+    # 6. Группируем ячейки в строки по y, столбцы по x
+    grid = group_rows(cells, tol=10)
     return grid, mask
 
-def ocr_cell(img, box, lang='chi_sim+chi_tra+eng+rus'):
+def ocr_cell(img, box, lang=OCR_LANG):
     x,y,w,h = box
     crop = img[y:y+h, x:x+w]
     txt = pytesseract.image_to_string(
@@ -108,41 +225,131 @@ def ocr_cell(img, box, lang='chi_sim+chi_tra+eng+rus'):
     txt = html.escape(txt.strip()).replace('\n','<br/>')
     return txt
 
-def ocr_free_text(img, table_mask, lang='chi_sim+chi_tra+eng+rus'):
+def table_regions(grid, gap=10):
+    """Склеивает соседние по вертикали строки ячеек в области таблиц.
+
+    Возвращает [((x0, y0, x1, y1), [индексы строк grid]), ...].
+    """
+    regions = []
+    for r, row in enumerate(grid):
+        x0 = min(x for x, _, _, _ in row)
+        y0 = min(y for _, y, _, _ in row)
+        x1 = max(x + w for x, _, w, _ in row)
+        y1 = max(y + h for _, y, _, h in row)
+        if regions and y0 <= regions[-1][0][3] + gap:
+            (rx0, ry0, rx1, ry1), rows = regions[-1]
+            regions[-1] = ((min(rx0, x0), ry0, max(rx1, x1), max(ry1, y1)), rows + [r])
+        else:
+            regions.append(((x0, y0, x1, y1), [r]))
+    return regions
+
+def read_region_cells(img, grid, region, rows, lang=OCR_LANG):
+    """OCR ячеек одной области таблицы одним вызовом tesseract.
+
+    Слово попадает в ячейку, в которой лежит его центр. Возвращает
+    {(r, c): текст} с исходным текстом, строки ячейки через '\n'.
+    """
+    rx0, ry0, rx1, ry1 = region
+    cells = [(r, c) for r in rows for c in range(len(grid[r]))]
+    index = BBoxIndex([(x, y, x + w, y + h) for x, y, w, h in (grid[r][c] for r, c in cells)])
+    crop = img[ry0:ry1, rx0:rx1]
+    data = pytesseract.image_to_data(
+        crop, lang=lang, config='--psm 6', output_type=Output.DICT
+    )
+    # (r, c) -> {(block, par, line): [слова]} в порядке чтения tesseract
+    cell_lines = defaultdict(dict)
+    for i, word in enumerate(data['text']):
+        word = word.strip()
+        if not word:
+            continue
+        cx = rx0 + data['left'][i] + data['width'][i] / 2
+        cy = ry0 + data['top'][i] + data['height'][i] / 2
+        for k in index.candidates((cx, cy, cx, cy)):
+            x, y, w, h = grid[cells[k][0]][cells[k][1]]
+            if x <= cx < x + w and y <= cy < y + h:
+                line_key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+                cell_lines[cells[k]].setdefault(line_key, []).append(word)
+                break
+    return {cell: '\n'.join(' '.join(words) for words in lines.values()).strip()
+            for cell, lines in cell_lines.items()}
+
+def ocr_region_cells(img, grid, region, rows, lang=OCR_LANG):
+    """То же, что read_region_cells, но текст в виде ocr_cell (экранированный, строки через <br/>)."""
+    return {cell: html.escape(txt).replace('\n', '<br/>')
+            for cell, txt in read_region_cells(img, grid, region, rows, lang).items()}
+
+def ocr_table_cells(img, grid, lang=OCR_LANG):
+    """OCR всех ячеек grid: один вызов tesseract на область таблицы."""
+    texts = [[''] * len(row) for row in grid]
+    for region, rows in table_regions(grid):
+        for (r, c), txt in ocr_region_cells(img, grid, region, rows, lang).items():
+            texts[r][c] = txt
+    return texts
+
+def read_free_words(img, table_mask, lang=OCR_LANG, min_conf=50):
+    """Слова вне таблиц: [{'text', 'x', 'y', 'w', 'h', 'line'}, ...] в пикселях картинки.
+
+    'line' - (block, par, line) tesseract, по нему слова собираются в строки.
+    """
     # удаляем области таблиц
     inv = cv2.bitwise_not(table_mask)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gray = to_gray(img)
     bg = cv2.bitwise_and(gray, gray, mask=inv)
 
     data = pytesseract.image_to_data(
         bg, lang=lang, output_type=Output.DICT
     )
-    spans = []
+    words = []
     n = len(data['text'])
     for i in range(n):
         txt = data['text'][i].strip()
         if not txt: continue
         conf = int(data['conf'][i])
-        if conf < 50: continue
-        x,y,w,h = (data['left'][i], data['top'][i],
-                   data['width'][i], data['height'][i])
-        spans.append({
-            'text': html.escape(txt).replace(' ','&nbsp;'),
-            'x': x, 'y': y
+        if conf < min_conf: continue
+        words.append({
+            'text': txt,
+            'x': data['left'][i], 'y': data['top'][i],
+            'w': data['width'][i], 'h': data['height'][i],
+            'line': (data['block_num'][i], data['par_num'][i], data['line_num'][i]),
         })
-    return spans
+    return words
 
-def image_to_html(img_path, out_html="out.html"):
-    img = cv2.imread(img_path)
-    grid, mask = detect_table_cells(img)
-    spans = ocr_free_text(img, mask)
-    tables = []
-    for row in grid:
-        cells = [ocr_cell(img, box) for box in row]
-        tables.append((row, cells))
+def ocr_free_text(img, table_mask, lang=OCR_LANG):
+    return [{'text': html.escape(w['text']).replace(' ','&nbsp;'), 'x': w['x'], 'y': w['y']}
+            for w in read_free_words(img, table_mask, lang)]
 
-    # Начинаем формировать HTML
-    html_out = ['<html><head><meta charset="utf-8"></head><body>']
+def _run_now(fn, *args):
+    # Future, уже выполненный в текущем потоке (когда пул не передан)
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def image_to_page_html(img, ocr_pool=None, detect_scale=DETECT_SCALE):
+    """HTML одной страницы-картинки (без <html>/<body>), список строк.
+
+    ocr_pool - executor для вызовов tesseract: свободный текст и области
+    таблиц (или отдельные ячейки) распознаются параллельно.
+    """
+    submit = ocr_pool.submit if ocr_pool is not None else _run_now
+    grid, mask = detect_table_cells(img, scale=detect_scale)
+    spans_future = submit(ocr_free_text, img, mask)
+    if BATCH_OCR:
+        region_futures = [submit(ocr_region_cells, img, grid, region, rows)
+                          for region, rows in table_regions(grid)]
+        cell_texts = [[''] * len(row) for row in grid]
+        for future in region_futures:
+            for (r, c), txt in future.result().items():
+                cell_texts[r][c] = txt
+    else:
+        cell_futures = [[submit(ocr_cell, img, box) for box in row] for row in grid]
+        cell_texts = [[future.result() for future in row] for row in cell_futures]
+    spans = spans_future.result()
+    tables = list(zip(grid, cell_texts, grid_spans(grid)))
+
+    html_out = []
 
     # 1) свободный текст
     html_out.append('<div style="position:relative;">')
@@ -152,7 +359,7 @@ def image_to_html(img_path, out_html="out.html"):
     html_out.append('</div>')
 
     # 2) таблицы с линиями
-    for row_boxes, row_texts in tables:
+    for row_boxes, row_texts, row_spans in tables:
         # определяем координаты таблицы
         xs = [x for x,_,_,_ in row_boxes]
         ys = [y for _,y,_,_ in row_boxes]
@@ -166,18 +373,36 @@ def image_to_html(img_path, out_html="out.html"):
                         'border="1" cellspacing="0" cellpadding="4">')
         # по одной строке (только по примеру)
         html_out.append('<tr>')
-        for cell_html in row_texts:
-            html_out.append(f'<td style="border:1px solid #000;">'
+        for cell_html, colspan in zip(row_texts, row_spans):
+            span_attr = f' colspan="{colspan}"' if colspan > 1 else ''
+            html_out.append(f'<td{span_attr} style="border:1px solid #000;">'
                             f'{cell_html}</td>')
         html_out.append('</tr></table><br/>')
+    return html_out
+
+def image_to_html(img_path, out_html="out.html"):
+    img = cv2.imread(img_path)
 
+    # Начинаем формировать HTML
+    html_out = ['<html><head><meta charset="utf-8"></head><body>']
+    html_out.extend(image_to_page_html(img))
     html_out.append('</body></html>')
 
     with open(out_html, "w", encoding="utf-8") as f:
         f.write("\n".join(html_out))
 
 
+def pdf_page_to_html(pdf_path, out_html="out.html", page_num=0, dpi=DPI):
+    with fitz.open(pdf_path) as doc:
+        img = render_page_image(doc[page_num], dpi)
+        html_out = ['<html><head><meta charset="utf-8"></head><body>']
+        html_out.extend(image_to_page_html(img))
+        html_out.append('</body></html>')
+
+    with open(out_html, "w", encoding="utf-8") as f:
+        f.write("\n".join(html_out))
+
 
 if __name__=="__main__":
-    # Передайте сюда свой PNG/JPG, полученный из PDF
-    image_to_html(img_path, "page.html")
+    # первая страница PDF растеризуется в память; для готового PNG/JPG - image_to_html(img_path, ...)
+    pdf_page_to_html(pdf_path, "page.html")
@@ -0,0 +1,141 @@
+"""Многостраничный OCR: PDF -> картинки страниц -> ячейки таблиц -> tesseract.
+
+Этапы идут в отдельных пулах потоков. Параллельно по ядрам работают только
+tesseract (внешний процесс) и тяжёлые операции OpenCV, которые отпускают GIL;
+растеризация PyMuPDF держит GIL, потоки render её не ускоряют, а лишь готовят
+следующие страницы, пока идёт распознавание:
+
+    render  - растеризация страниц в память через PyMuPDF (render_workers)
+    page    - поиск ячеек и сборка HTML страницы (page_workers)
+    ocr     - вызовы tesseract: свободный текст и области таблиц (ocr_workers)
+
+Одновременно в работе не больше max_pending страниц (backpressure): следующая
+страница растеризуется, только когда готовая ушла в вывод. Страницы выдаются
+строго по порядку.
+
+    python -m var8.pipeline example.pdf page.html --page-workers 4 --ocr-workers 8
+"""
+import argparse
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz  # pip install PyMuPDF
+
+from common.writer import HtmlWriter
+from var8.main import DETECT_SCALE, DPI, image_to_page_html, render_page_image
+
+CPU_COUNT = os.cpu_count() or 1
+RENDER_WORKERS = 2
+PAGE_WORKERS = CPU_COUNT
+OCR_WORKERS = CPU_COUNT
+MAX_PENDING = 2 * CPU_COUNT
+HTML_HEAD = '<html><head><meta charset="utf-8"></head><body>'
+HTML_TAIL = '</body></html>'
+
+
+def page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+class PageRenderer:
+    """render(pdf_path, page_num, dpi) для convert_pages: серая картинка страницы
+    page_num (с 0), см. var8.main.render_page_image.
+
+    fitz.Document не потокобезопасен: каждый поток растеризации открывает свой,
+    close() закрывает их все.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._opened = []
+        self._lock = threading.Lock()
+
+    def __call__(self, pdf_path, page_num, dpi=DPI):
+        docs = self._local.__dict__.setdefault('docs', {})
+        if pdf_path not in docs:
+            docs[pdf_path] = fitz.open(pdf_path)
+            with self._lock:
+                self._opened.append(docs[pdf_path])
+        return render_page_image(docs[pdf_path][page_num], dpi)
+
+    def close(self):
+        with self._lock:
+            opened, self._opened = self._opened, []
+        for doc in opened:
+            doc.close()
+
+
+def _page_html(page_num, image_future, ocr_pool, detect_scale=DETECT_SCALE):
+    img = image_future.result()
+    height, width = img.shape[:2]
+    html_out = [f'<div class="page" data-page="{page_num + 1}" '
+                f'style="position:relative; width:{width}px; height:{height}px;">']
+    html_out.extend(image_to_page_html(img, ocr_pool, detect_scale))
+    html_out.append('</div>')
+    return '\n'.join(html_out)
+
+
+def convert_pages(pdf_path, dpi=DPI, render_workers=RENDER_WORKERS, page_workers=PAGE_WORKERS,
+                  ocr_workers=OCR_WORKERS, max_pending=MAX_PENDING, detect_scale=DETECT_SCALE,
+                  render=None, pages=None):
+    """HTML страниц по порядку; render(pdf_path, page_num, dpi) даёт картинку страницы,
+    по умолчанию - PageRenderer, документы которого закрываются по окончании."""
+    if pages is None:
+        pages = range(page_count(pdf_path))
+    pages = iter(pages)
+    renderer = PageRenderer() if render is None else None
+    render = render or renderer
+    try:
+        with ThreadPoolExecutor(render_workers, thread_name_prefix='render') as render_pool, \
+                ThreadPoolExecutor(page_workers, thread_name_prefix='page') as page_pool, \
+                ThreadPoolExecutor(ocr_workers, thread_name_prefix='ocr') as ocr_pool:
+            pending = deque()
+
+            def submit_next():
+                for page_num in pages:
+                    image_future = render_pool.submit(render, pdf_path, page_num, dpi)
+                    pending.append(page_pool.submit(_page_html, page_num, image_future, ocr_pool, detect_scale))
+                    return
+
+            for _ in range(max(1, max_pending)):
+                submit_next()
+            while pending:
+                page_html = pending.popleft().result()
+                submit_next()
+                yield page_html
+    finally:
+        # пулы уже остановлены: документы больше никто не растеризует
+        if renderer is not None:
+            renderer.close()
+
+
+def pdf_to_html(pdf_path, out_html, **options):
+    with HtmlWriter(out_html) as out:
+        out.write(HTML_HEAD)
+        for page_html in convert_pages(pdf_path, **options):
+            out.write('\n' + page_html)
+        out.write('\n' + HTML_TAIL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OCR a scanned PDF into HTML')
+    parser.add_argument('input')
+    parser.add_argument('output', nargs='?', default='page.html')
+    parser.add_argument('--dpi', type=int, default=DPI)
+    parser.add_argument('--render-workers', type=int, default=RENDER_WORKERS)
+    parser.add_argument('--page-workers', type=int, default=PAGE_WORKERS)
+    parser.add_argument('--ocr-workers', type=int, default=OCR_WORKERS)
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING, help='pages in flight at most')
+    parser.add_argument('--detect-scale', type=float, default=DETECT_SCALE, help='image scale for table line detection')
+    args = parser.parse_args()
+    pdf_to_html(args.input, args.output, dpi=args.dpi, render_workers=args.render_workers,
+                page_workers=args.page_workers, ocr_workers=args.ocr_workers, max_pending=args.max_pending,
+                detect_scale=args.detect_scale)
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,72 +2,117 @@ import fitz   # pip install PyMuPDF
 import html
 from collections import defaultdict
 
-def overlaps(b1, b2, tol=1.0):
-    return not (b1[3] < b2[1] - tol or b1[1] > b2[3] + tol)
+from common.cache import TableCache
+from common.images import ImageStore
+from common.page_analysis import iter_page_analyses
+from common.spatial import BBoxIndex
+from common.styles import StyleTable, coalesce
+from common.table_prefilter import TablePrefilter
+from common.writer import HtmlWriter
 
-def pdf_to_html(pdf_path: str, html_path: str):
-    doc = fitz.open(pdf_path)
-    out = [
-        "<!DOCTYPE html>",
-        "<html><head><meta charset='utf-8'>",
-        "<style>",
-        "  body { font-family:sans-serif; font-size:14px; line-height:1.5; }",
-        "  p { margin:0.5em 0; white-space:pre-wrap; }",
-        "  table { border-collapse:collapse; margin:0.5em 0; width:100%; }",
-        "  td,th { border:1px solid #444; padding:4px; vertical-align:top; }",
-        "</style>",
-        "</head><body>"
-    ]
+# кэш распознанных таблиц, включается переменной окружения PDF_TABLE_CACHE_DIR
+TABLE_CACHE = TableCache.from_env()
+# таблицы ищутся только на страницах с линиями разметки (common.table_prefilter);
+# None - find_tables() на каждой странице
+TABLE_PREFILTER = TablePrefilter()
+# стили спанов выносятся в CSS-классы, соседние спаны с одним стилем склеиваются;
+# False - как раньше, style="..." на каждом спане
+INTERN_STYLES = True
+# картинки пишутся файлами в <имя html>_images/ и подключаются <img loading="lazy">
+EXTRACT_IMAGES = True
+
+HTML_HEAD = [
+    "<!DOCTYPE html>",
+    "<html><head><meta charset='utf-8'>",
+    "<style>",
+    "  body { font-family:sans-serif; font-size:14px; line-height:1.5; }",
+    "  p { margin:0.5em 0; white-space:pre-wrap; }",
+    "  table { border-collapse:collapse; margin:0.5em 0; width:100%; }",
+    "  td,th { border:1px solid #444; padding:4px; vertical-align:top; }",
+    "</style>",
+    "</head><body>"
+]
+HTML_TAIL = "</body></html>"
 
-    for page in doc:
-        blocks = []
+def span_style(sp):
+    return (
+        f"font-family:'{sp.get('font','')}';"
+        f"font-size:{sp.get('size',0)}px;"
+        f"color:#{sp.get('color',0):06x}"
+    )
 
-        # 1) извлечь таблицы
-        for tbl in page.find_tables():
-            x0, y0, x1, y1 = tbl.bbox
-            # получить matrix строк через extract()
-            rows = tbl.extract()  # List[List[str]]
-            tbl_html = ["<table>"]
-            for row in rows:
-                tbl_html.append("<tr>")
-                for cell in row:
-                    txt = html.escape(cell or "").replace("\n","<br>")
-                    tbl_html.append(f"<td>{txt}</td>")
-                tbl_html.append("</tr>")
-            tbl_html.append("</table>")
-            blocks.append((y0, x0, "".join(tbl_html)))
+def render_page(analysis, styles=None, images=None):
+    blocks = []
 
-        # 2) извлечь текстовые блоки вне таблиц
-        table_bboxes = [t.bbox for t in page.find_tables()]
-        for b in page.get_text("dict")["blocks"]:
-            if b["type"] != 0:
-                continue
-            bb = b["bbox"]
-            if any(overlaps(bb, tb) for tb in table_bboxes):
-                continue
-            y0, x0 = bb[1], bb[0]
-            p = ["<p>"]
-            for line in b["lines"]:
+    # 1) извлечь таблицы (один раз на страницу)
+    tables = analysis.tables
+    for tbl in tables:
+        x0, y0, x1, y1 = tbl["bbox"]
+        # matrix строк из extract()
+        rows = tbl["rows"]  # List[List[str]]
+        tbl_html = ["<table>"]
+        for row in rows:
+            tbl_html.append("<tr>")
+            for cell in row:
+                txt = html.escape(cell or "").replace("\n","<br>")
+                tbl_html.append(f"<td>{txt}</td>")
+            tbl_html.append("</tr>")
+        tbl_html.append("</table>")
+        blocks.append((y0, x0, "".join(tbl_html)))
+
+    # 2) извлечь текстовые блоки вне таблиц
+    table_index = BBoxIndex([t["bbox"] for t in tables])
+    for b in analysis.text_dict["blocks"]:
+        if b["type"] != 0:
+            continue
+        bb = b["bbox"]
+        if table_index.any_overlap_y(bb):
+            continue
+        y0, x0 = bb[1], bb[0]
+        p = ["<p>"]
+        for line in b["lines"]:
+            if styles is None:
                 for sp in line["spans"]:
-                    style = (
-                        f"font-family:'{sp.get('font','')}';"
-                        f"font-size:{sp.get('size',0)}px;"
-                        f"color:#{sp.get('color',0):06x}"
-                    )
-                    p.append(f"<span style=\"{style}\">{html.escape(sp['text'])}</span>")
-                p.append("<br>")
-            p.append("</p>")
-            blocks.append((y0, x0, "".join(p)))
+                    p.append(f"<span style=\"{span_style(sp)}\">{html.escape(sp['text'])}</span>")
+            else:
+                for style, group in coalesce(line["spans"], span_style):
+                    text = "".join(sp["text"] for sp in group)
+                    p.append(f"<span class=\"{styles(style)}\">{html.escape(text)}</span>")
+            p.append("<br>")
+        p.append("</p>")
+        blocks.append((y0, x0, "".join(p)))
+
+    # 3) картинки - файлами, по одному на xref / содержимое
+    if images is not None:
+        for bbox, url in images.page_images(analysis.page):
+            blocks.append((bbox[1], bbox[0], f"<p>{images.img_tag(url, bbox)}</p>"))
 
-        # 3) сортировка по y затем x и добавление в выход
-        for _, _, html_block in sorted(blocks, key=lambda x: (x[0], x[1])):
-            out.append(html_block)
+    # 4) сортировка по y затем x
+    page_html = [html_block for _, _, html_block in sorted(blocks, key=lambda x: (x[0], x[1]))]
+    # новые классы этой страницы - перед ней
+    css = styles.take_css() if styles is not None else ""
+    return [css] + page_html if css else page_html
 
-    out.append("</body></html>")
-    with open(html_path, "w", encoding="utf-8") as f:
-        f.write("\n".join(out))
+def iter_html(pdf_path: str, images=None):
+    """Документ по частям: заголовок, по одной части на страницу, конец.
+
+    images - common.images.ImageStore, None - картинки пропускаются.
+    """
+    doc = fitz.open(pdf_path)
+    yield "\n".join(HTML_HEAD)
+    styles = StyleTable() if INTERN_STYLES else None
+    for analysis in iter_page_analyses(doc, TABLE_CACHE, table_filter=TABLE_PREFILTER):
+        yield "\n".join(render_page(analysis, styles, images))
+    yield HTML_TAIL
+
+def pdf_to_html(pdf_path: str, html_path: str):
+    images = ImageStore.for_output(html_path) if EXTRACT_IMAGES else None
+    with HtmlWriter(html_path) as out:
+        # пустые страницы пропускаются, как и раньше
+        out.write_all((chunk for chunk in iter_html(pdf_path, images) if chunk), sep="\n")
 
 # пример:
 # pdf_to_html("input.pdf", "output.html")
 
-pdf_to_html('example.pdf', 'output.html')
+if __name__ == "__main__":
+    pdf_to_html('example.pdf', 'output.html')